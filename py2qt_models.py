@@ -9,12 +9,22 @@
 __author__ = r"Danil Tolmachev (Daniel.Tolmachev@gmail.com/Danil.Tolmachev@tu-dortmund.de)"
 
 from qtpy import QtCore
-from collections.abc import Collection,Mapping
-from collections import OrderedDict
-from numbers import Number
+from collections.abc import Collection,Mapping,Sequence,Hashable
+from collections import OrderedDict,deque
+from numbers import Number,Real
 from enum import Enum
-import types,re,sys
+import types,re,sys,threading,inspect,weakref
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from array import array
+from functools import wraps,partial
+from bisect import bisect_right
 MethodWrapperType = getattr(types,"MethodWrapperType",None)
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 # DEFAULT_UNEXPANDABLE_TYPES = [int, float, str, bytes, bytearray, type(None),
@@ -23,16 +33,495 @@ DEFAULT_UNEXPANDABLE_TYPES = [Number, str, bytes, bytearray, type(None),
 
 
 
+class LRUCache(object):
+    """
+    dictionary of limited size, least recently used items are dropped first
+    """
+    def __init__(self,maxsize,getsizeof = None):
+        """
+        :param maxsize: maximal total size of stored items
+        :param getsizeof: function returning size of an item, if None each item has size 1
+        """
+        self.maxsize = maxsize
+        self.getsizeof = getsizeof
+        self.size = 0
+        self._items = OrderedDict()
+    def _sizeof(self,val):
+        return self.getsizeof(val) if self.getsizeof else 1
+    def get(self,key,default = None):
+        try:
+            val = self._items[key]
+        except KeyError:
+            return default
+        self._items.move_to_end(key)
+        return val
+    def put(self,key,val):
+        if key in self._items:
+            self.pop(key)
+        self._items[key] = val
+        self.size += self._sizeof(val)
+        while self.size > self.maxsize and len(self._items) > 1:
+            k,v = self._items.popitem(last=False)
+            self.size -= self._sizeof(v)
+    def pop(self,key,default = None):
+        if key not in self._items:
+            return default
+        val = self._items.pop(key)
+        self.size -= self._sizeof(val)
+        return val
+    def clear(self):
+        self._items.clear()
+        self.size = 0
+    def __contains__(self,key):
+        return key in self._items
+    def __len__(self):
+        return len(self._items)
+    def keys(self):
+        return list(self._items)
+
+_MISSING = object()
+def cached_display(data):
+    """
+    decorator for data() method of the models,
+    DisplayRole results are stored in model.display_cache by (node, row, column)
+    """
+    @wraps(data)
+    def wrapper(self,index,role):
+        if role != QtCore.Qt.DisplayRole or self.display_cache is None:
+            return data(self,index,role)
+        key = (index.internalId(),index.row(),index.column())
+        ret = self.display_cache.get(key,_MISSING)
+        if ret is _MISSING:
+            ret = data(self,index,role)
+            self.display_cache.put(key,ret)
+        return ret
+    return wrapper
+
+class Placeholder(object):
+    """
+    value of a row shown instead of real value while it is not available (e.g. "loading...")
+    """
+    __slots__ = ["text"]
+    def __init__(self,text):
+        self.text = text
+    def __str__(self):
+        return self.text
+
+_UNRESOLVED = Placeholder("") # value of lazy attribute, which was not evaluated yet
+
 class TreeElement(object):
-    __slots__ = ["parent","name","value","children","loaded","index","parent_index"]
+    __slots__ = ["parent","name","value","children","loaded","index","parent_index","pending","signature"]
     def __init__(self,value,parent = None,name = "",index = 0, children = []):
         self.value = value
         self.parent = parent
         self.name = name
         self.children = []
-        self.index = 0
+        self.index = index
         self.loaded = False
         self.parent_index = None
+        self.pending = None # iterator over children which are not loaded yet (see fetch_batch)
+        self.signature = None # size of container value seen by the last refresh, see _valueSignature
+
+def _inverse_permutation(order):
+    """
+    returns inverse[src] = row for permutation order[row] = src (list or numpy array)
+    """
+    if hasattr(order,"argsort"): #numpy array
+        return order.argsort()
+    inverse = [0]*len(order)
+    for row,src in enumerate(order):
+        inverse[src] = row
+    return inverse
+
+class VirtualChildren(object):
+    """
+    list-like replacement of TreeElement.children for indexable objects (list, tuple, range, numpy array, mapping)
+    rows count is taken from len(obj), TreeElement is created only when row data is requested
+    indexes of virtual rows point to this container, so view can create indexes for all rows for free
+    if order is set (see sort), row of the view is order[row] in the object
+    """
+    __slots__ = ["parent","keys","count","items","parent_index","order","inverse"]
+    def __init__(self,parent,keys = None):
+        """
+        :param parent: TreeElement, which value is indexable
+        :param keys: list of keys, if value is a mapping, None for sequences
+        """
+        self.parent = parent
+        self.keys = keys
+        self.count = len(parent.value) if keys is None else len(keys)
+        self.items = {} # row in the object -> TreeElement
+        self.parent_index = None
+        self.order = None
+        self.inverse = None
+    def __len__(self):
+        return self.count
+    def sourceRow(self,row):
+        return row if self.order is None else int(self.order[row])
+    def viewRow(self,src):
+        return src if self.inverse is None else int(self.inverse[src])
+    def setOrder(self,order):
+        """
+        sets permutation of rows (sequence of rows in the object), None restores natural order
+        """
+        self.order = order
+        self.inverse = None if order is None else _inverse_permutation(order)
+        for src,el in self.items.items():
+            el.index = self.viewRow(src)
+    def __getitem__(self,row):
+        if row < 0 or row >= self.count:
+            raise IndexError(row)
+        src = self.sourceRow(row)
+        el = self.items.get(src)
+        if el is None:
+            el = TreeElement(self._value(src), name=self._name(src), parent=self.parent, index=row)
+            self.items[src] = el
+        return el
+    def _name(self,src):
+        return "[{}]".format(src) if self.keys is None else self.keys[src]
+    def _value(self,src):
+        if self.keys is None:
+            return self.parent.value[src]
+        return self.parent.value[self.keys[src]]
+    def nameAt(self,row):
+        return self._name(self.sourceRow(row))
+    def valueAt(self,row):
+        """
+        returns value of the row without creating TreeElement
+        """
+        src = self.sourceRow(row)
+        el = self.items.get(src)
+        if el is not None:
+            return el.value
+        return self._value(src)
+    def __iter__(self):
+        for row in range(self.count):
+            yield self[row]
+
+class DataFrameRows(VirtualChildren):
+    """
+    rows of pandas DataFrame, row Series is created only if its value is requested
+    """
+    __slots__ = []
+    def _name(self,src):
+        return str(self.parent.value.index[src])
+    def _value(self,src):
+        return self.parent.value.iloc[src]
+
+class ArrowTableRows(VirtualChildren):
+    """
+    rows of pyarrow.Table, row is converted to dict only if its value is requested
+    """
+    __slots__ = []
+    def _value(self,src):
+        return self.parent.value.slice(src,1).to_pylist()[0]
+
+class ArrowColumn(object):
+    """
+    numpy-like read access to pyarrow ChunkedArray column,
+    only chunks under requested rows are converted to numpy
+    """
+    def __init__(self,column):
+        self.column = column
+    def __len__(self):
+        return len(self.column)
+    def __getitem__(self,rows):
+        """
+        :param rows: row number (python value is returned), slice or array of row numbers (numpy array is returned)
+        """
+        if isinstance(rows,slice):
+            start,stop,step = rows.indices(len(self.column))
+            values = self._toNumpy(self.column.slice(start,max(0,stop-start))) # slice of ChunkedArray is zero-copy
+            return values[::step] if step != 1 else values
+        if isinstance(rows,Number):
+            return self.column[int(rows)].as_py()
+        return self._toNumpy(self.column.take(rows))
+    @staticmethod
+    def _toNumpy(values):
+        import pyarrow.types
+        if values.null_count and pyarrow.types.is_integer(values.type):
+            # to_numpy converts integers with nulls to float, python values are shown like single cells
+            return numpy.array(values.to_pylist(),dtype=object)
+        return values.to_numpy()
+
+class CompactNodeStore(object):
+    """
+    alternative to TreeElement objects: nodes are kept in flat arrays and identified by integer id,
+    the id is passed to createIndex instead of a pointer, node 0 is the root
+    """
+    def __init__(self,value):
+        self.parent = array("q",[-1])
+        self.row = array("q",[0])
+        self.loaded = array("b",[0])
+        self.names = [""]
+        self.values = [value]
+        self.children = [None] # array of children ids for loaded nodes
+        self.pending = {} # id -> iterator over children which are not loaded yet (see fetch_batch)
+    def __len__(self):
+        return len(self.values)
+    def addChildren(self,node_id,elements):
+        """
+        appends children to the node
+        :param elements: iterable of TreeElement (or any objects with name and value)
+        """
+        children = self.children[node_id]
+        if children is None:
+            children = self.children[node_id] = array("q")
+        for el in elements:
+            new_id = len(self.values)
+            self.parent.append(node_id)
+            self.row.append(len(children))
+            self.loaded.append(0)
+            self.names.append(el.name)
+            self.values.append(el.value)
+            self.children.append(None)
+            children.append(new_id)
+
+class CompactElement(object):
+    """
+    light-weight view of a node in CompactNodeStore with the same attributes as TreeElement,
+    it is created on request and is not stored anywhere
+    """
+    __slots__ = ["store","id"]
+    def __init__(self,store,node_id):
+        self.store = store
+        self.id = node_id
+    @property
+    def name(self):
+        return self.store.names[self.id]
+    @property
+    def value(self):
+        return self.store.values[self.id]
+    @property
+    def index(self):
+        return self.store.row[self.id]
+    @property
+    def loaded(self):
+        return bool(self.store.loaded[self.id])
+    @property
+    def parent(self):
+        p = self.store.parent[self.id]
+        return None if p < 0 else CompactElement(self.store,p)
+    @property
+    def children(self):
+        return [CompactElement(self.store,i) for i in self.store.children[self.id] or ()]
+    @property
+    def pending(self):
+        return self.store.pending.get(self.id)
+
+class ObjectSearchIndex(QtCore.QObject):
+    """
+    index of names and scalar values of the tree, it is built in a background thread
+    by walking the object graph with model.childItems (model elements are not created),
+    it can be searched while it is being built
+    each object is visited once (so cycles are not followed), walk stops at max_depth and max_nodes
+    """
+    sigProgress = QtCore.Signal(int) # number of indexed nodes
+    sigFinished = QtCore.Signal(int)
+    def __init__(self,model,max_depth = 8,max_nodes = 1000000,max_value_len = 200,progress_step = 10000):
+        super().__init__()
+        self.model = model
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.max_value_len = max_value_len
+        self.progress_step = progress_step
+        self._parents = array("q")
+        self._names = []
+        self._lines = [] # lower case "name<tab>value" for each node
+        self._offsets = array("q") # offset of each line in joined text
+        self._size = 0
+        self._text = ""
+        self._text_count = 0
+        self._cancelled = threading.Event()
+        self._thread = None
+        self.finished = False
+    def __len__(self):
+        return min(len(self._lines),len(self._offsets))
+    def start(self):
+        self._thread = threading.Thread(target=self._run,daemon=True)
+        self._thread.start()
+    def cancel(self):
+        self._cancelled.set()
+    def _searchText(self,name,val):
+        if isinstance(val,(Number,str,bytes)):
+            val = str(val)[:self.max_value_len]
+        else:
+            val = ""
+        return "{}\t{}".format(name,val).replace("\n"," ").lower()
+    def _add(self,parent,name,val):
+        line = self._searchText(name,val)
+        self._parents.append(parent)
+        self._names.append(name)
+        self._offsets.append(self._size)
+        self._size += len(line) + 1
+        self._lines.append(line)
+        return len(self._names) - 1
+    def _run(self):
+        root = self.model.object
+        visited = {id(root):root} # objects are kept, so their ids are not reused during the walk
+        queue = deque([(-1,root,0)])
+        while queue and not self._cancelled.is_set():
+            parent, obj, depth = queue.popleft()
+            if depth >= self.max_depth:
+                continue
+            try:
+                for name, val in self.model.childItems(obj):
+                    if self._cancelled.is_set() or len(self._names) >= self.max_nodes:
+                        queue.clear()
+                        break
+                    entry = self._add(parent,name,val)
+                    if entry % self.progress_step == 0:
+                        self.sigProgress.emit(entry)
+                    if id(val) not in visited and self.model.valueHasChildren(val):
+                        visited[id(val)] = val
+                        queue.append((entry,val,depth + 1))
+            except Exception: # object can not be listed, it stays as a leaf
+                continue
+        self.finished = True
+        self.sigFinished.emit(len(self))
+    def path(self,entry):
+        """
+        returns tuple of names from the root to the entry
+        """
+        path = []
+        while entry >= 0:
+            path.append(self._names[entry])
+            entry = self._parents[entry]
+        return tuple(reversed(path))
+    def find(self,text,max_results = 100):
+        """
+        returns entries which name or value contain text (case insensitive)
+        """
+        text = text.lower()
+        n = len(self)
+        if not text or not n:
+            return []
+        if n != self._text_count:
+            self._text = "\n".join(self._lines[:n])
+            self._text_count = n
+        results = []
+        pos = self._text.find(text)
+        while pos >= 0 and len(results) < max_results:
+            entry = bisect_right(self._offsets,pos,0,n) - 1
+            results.append(entry)
+            end = self._offsets[entry + 1] if entry + 1 < n else len(self._text)
+            pos = self._text.find(text,end)
+        return results
+
+class ArraySummary(QtCore.QObject):
+    """
+    min/max/mean/NaN count of numeric arrays, computed in a background thread by chunks along the first axis,
+    so memory use is bounded by the chunk and GIL is released by numpy between Python steps
+    summaries are cached per array id, the cache keeps only weak references,
+    entry is dropped when its array is freed, so the id can be reused safely
+    sigReady is emitted with the array when its summary is computed
+    """
+    sigReady = QtCore.Signal(object)
+    def __init__(self,chunk_size = 1<<20,cache_size = 256):
+        """
+        :param chunk_size: number of elements processed at once
+        :param cache_size: number of arrays which summaries are kept
+        """
+        super().__init__()
+        self.chunk_size = chunk_size
+        self.cache = LRUCache(cache_size) # id -> (weak reference to array, summary)
+        self._queue = deque()
+        self._queued = set()
+        self._lock = threading.Condition()
+        self._thread = None
+        self._stopped = False
+    @staticmethod
+    def supported(val):
+        return numpy is not None and isinstance(val,numpy.ndarray) and val.ndim > 0 and val.size > 0 \
+            and val.dtype.kind in "biufc"
+    def get(self,arr):
+        """
+        returns summary dict (min, max, mean, nan, count) of the array,
+        if it is not computed yet, computation is scheduled and None is returned
+        """
+        with self._lock:
+            item = self.cache.get(id(arr))
+            if item is not None and item[0]() is arr:
+                return item[1]
+            if self._stopped or id(arr) in self._queued:
+                return None
+            self._queue.append(arr)
+            self._queued.add(id(arr))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,daemon=True)
+                self._thread.start()
+            self._lock.notify()
+        return None
+    def shutdown(self):
+        """
+        stops the worker thread, pending arrays are dropped
+        """
+        with self._lock:
+            self._stopped = True
+            self._queue.clear()
+            self._queued.clear()
+            self._lock.notify()
+    @staticmethod
+    def text(summary):
+        parts = []
+        if summary["min"] is not None:
+            parts.append("min {:.6g}, max {:.6g}".format(summary["min"],summary["max"]))
+        parts.append("mean {:.6g}".format(summary["mean"]))
+        if summary["nan"]:
+            parts.append("NaN {}".format(summary["nan"]))
+        return ", ".join(parts)
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._queue and not self._stopped:
+                    self._lock.wait()
+                if self._stopped:
+                    return
+                arr = self._queue.popleft()
+            try:
+                summary = self._compute(arr)
+            except Exception: # array can not be read, it is not retried
+                summary = None
+            with self._lock:
+                self._queued.discard(id(arr))
+                if summary is not None and not self._stopped:
+                    self.cache.put(id(arr),(weakref.ref(arr,partial(self._forget,id(arr))),summary))
+                else:
+                    summary = None
+            if summary is not None:
+                self.sigReady.emit(arr)
+            del arr # the last array is not kept while waiting
+    def _forget(self,key,ref):
+        # called when cached array is freed
+        with self._lock:
+            item = self.cache.get(key)
+            if item is not None and item[0] is ref:
+                self.cache.pop(key)
+    def _compute(self,arr):
+        kind = arr.dtype.kind
+        step = max(1,self.chunk_size // max(1,arr.size // len(arr)))
+        lo = hi = None
+        total = 0
+        count = nan = 0
+        for start in range(0,len(arr),step):
+            if self._stopped:
+                return None
+            chunk = numpy.asarray(arr[start:start + step])
+            if kind in "fc":
+                missing = int(numpy.isnan(chunk).sum())
+                nan += missing
+                total += numpy.nansum(chunk,dtype="c16" if kind == "c" else "f8")
+                if kind == "c" or missing == chunk.size:
+                    count += chunk.size - missing
+                    continue
+                c_lo, c_hi = numpy.nanmin(chunk), numpy.nanmax(chunk)
+                count += chunk.size - missing
+            else:
+                total += chunk.sum(dtype="f8")
+                c_lo, c_hi = chunk.min(), chunk.max()
+                count += chunk.size
+            lo = c_lo if lo is None else min(lo,c_lo)
+            hi = c_hi if hi is None else max(hi,c_hi)
+        return dict(min=lo,max=hi,mean=total/count if count else float("nan"),nan=nan,count=count)
 
 class PythonTreeModelBase(QtCore.QAbstractItemModel):
     class MODE(Enum):
@@ -40,7 +529,8 @@ class PythonTreeModelBase(QtCore.QAbstractItemModel):
         LIST = 2
         ZIPFILE = 5
         HDFFILE = 6
-    def __init__(self,obj,col_type = 1,encoding = None, inline_items=3):
+    def __init__(self,obj,col_type = 1,encoding = None, inline_items=3, fetch_batch = None,
+                 virtual_children = False, compact_nodes = False, display_cache_size = 0, array_summary = None):
         """
 
         :param obj:
@@ -55,6 +545,17 @@ class PythonTreeModelBase(QtCore.QAbstractItemModel):
                 to view one number
                 there are often values that are represented by pair values, e.g. range,
                 or by 3 values e.g. coordinates
+        :param fetch_batch: if set, children are loaded by batches of this size
+            using canFetchMore/fetchMore, so view loads more items while scrolling
+            (only for models which create children with _addChildren)
+        :param virtual_children: if True, children of indexable objects (sequences, numpy arrays, mappings)
+            are not created in advance, rowCount is len(obj) and obj[row] is resolved when the row is requested
+        :param compact_nodes: if True, nodes are kept in CompactNodeStore instead of TreeElement objects,
+            indexes carry integer node id, virtual_children is not used in this mode
+        :param display_cache_size: if >0, formatted DisplayRole values of this many cells are cached,
+            call invalidateDisplayCache() when values of the object are changed
+        :param array_summary: True or ArraySummary (can be shared by models) to show min/max/mean of numeric arrays,
+            they are computed in background, cells are updated when summary is ready
         """
         self.object = obj
         self.col_name = -1
@@ -63,43 +564,614 @@ class PythonTreeModelBase(QtCore.QAbstractItemModel):
         self.encoding = encoding
         self.mode = self.MODE.LIST
         self.inline_items = inline_items
+        self.fetch_batch = fetch_batch
+        self.virtual_children = virtual_children and not compact_nodes
+        self.compact_nodes = compact_nodes
+        self.nodes = None
+        self.display_cache = LRUCache(display_cache_size) if display_cache_size else None
+        self.search_index = None
+        self._sort_column = None
+        self._sort_reverse = False
+        self.array_summary = ArraySummary() if array_summary is True else array_summary or None
+        self._summary_waiting = {} # id of array -> persistent indexes to update
         super().__init__()
+        if self.array_summary is not None:
+            self.array_summary.sigReady.connect(self._onSummaryReady)
+        if self.display_cache is not None: # removed elements may be reused at the same address
+            self.rowsRemoved.connect(self.display_cache.clear)
         self._init_data()
 
     def _init_data(self):
+        if self.display_cache is not None:
+            self.display_cache.clear()
+        if self.compact_nodes:
+            self.nodes = CompactNodeStore(self.object)
+            self.el0 = CompactElement(self.nodes,0)
+            self._loadNode(0)
+            return
         self.el0 = TreeElement(self.object)
         self.createChildren(self.el0)
 
+    def _loadNode(self,node_id):
+        """
+        creates children of the node in compact store,
+        createChildren is run on a temporary TreeElement and its children are moved into the store
+        """
+        tmp = TreeElement(self.nodes.values[node_id])
+        self.createChildren(tmp)
+        self.nodes.addChildren(node_id,tmp.children)
+        tmp.children = [] # children refer to tmp, break the cycle so they are freed immediately
+        if tmp.pending is not None:
+            self.nodes.pending[node_id] = tmp.pending
+        self.nodes.loaded[node_id] = 1
+
+    def elementFromIndex(self,index):
+        """
+        returns TreeElement for the given index (root element for invalid index)
+        """
+        if not index.isValid():
+            return self.el0
+        if self.nodes is not None:
+            return CompactElement(self.nodes,index.internalId())
+        el = index.internalPointer()
+        if isinstance(el,VirtualChildren): #virtual row, TreeElement is created on demand
+            el = el[index.row()]
+        return el
+    def valueFromIndex(self,index):
+        """
+        returns value for the given index, for virtual rows TreeElement is not created
+        """
+        if self.nodes is not None:
+            return self.nodes.values[index.internalId() if index.isValid() else 0]
+        if index.isValid() and isinstance(index.internalPointer(),VirtualChildren):
+            return index.internalPointer().valueAt(index.row())
+        return self.elementFromIndex(index).value
+    def nameFromIndex(self,index):
+        """
+        returns name for the given index, for virtual rows TreeElement is not created
+        """
+        if self.nodes is None and index.isValid() and isinstance(index.internalPointer(),VirtualChildren):
+            return index.internalPointer().nameAt(index.row())
+        return self.elementFromIndex(index).name
     def index(self, row, col, parent=None, *args, **kwargs):
-        if not parent.isValid():
-            par_el = self.el0
-        else:
-            par_el = parent.internalPointer()
+        if self.nodes is not None:
+            par_id = parent.internalId() if parent.isValid() else 0
+            return self.createIndex(row, col, self.nodes.children[par_id][row])
+        par_el = self.elementFromIndex(parent)
+        if isinstance(par_el.children,VirtualChildren):
+            # do not create TreeElement here, view may request indexes for all rows
+            par_el.children.parent_index = parent
+            return self.createIndex(row, col, par_el.children)
+        if row >= len(par_el.children): # e.g. lazy element which turned out to be empty
+            return QtCore.QModelIndex()
         cur_el = par_el.children[row]
         index = self.createIndex(row, col,cur_el)
         cur_el.parent_index = parent
         return index
     def parent(self, index=None):
+        if self.nodes is not None:
+            par_id = self.nodes.parent[index.internalId()] if index.isValid() else -1
+            if par_id <= 0:
+                return QtCore.QModelIndex()
+            return self.createIndex(self.nodes.row[par_id], 0, par_id)
         if index.isValid():
             el = index.internalPointer()
         else:
             el = self.el0
+        if el.parent_index is None: # root
+            return QtCore.QModelIndex()
         return el.parent_index
     def indexForElement(self,el):
         if el is None or el.parent is None:
-            index = self.createIndex(-1,-1,self.el0)
-        else:
-            index = self.indexForElement(el.parent)
-        return index
+            return QtCore.QModelIndex()
+        if self.nodes is not None:
+            return self.createIndex(el.index,0,el.id)
+        siblings = el.parent.children
+        row = el.index if isinstance(siblings,VirtualChildren) else siblings.index(el)
+        return self.index(row,0,self.indexForElement(el.parent))
     def rowCount(self, parent=None, *args, **kwargs):
+        if parent is not None and parent.column() > 0: # only the first column has children
+            return 0
+        if self.nodes is not None:
+            node_id = parent.internalId() if parent is not None and parent.isValid() else 0
+            if not self.nodes.loaded[node_id]:
+                if node_id and not self.hasChildren(parent): # same as for TreeElement below
+                    return 0
+                self._loadNode(node_id)
+                if self._sort_column is not None:
+                    self._sortNode(node_id)
+            return len(self.nodes.children[node_id])
         if parent is None or not parent.isValid():
             el = self.el0
         else:
-            el = parent.internalPointer()
+            if isinstance(parent.internalPointer(),VirtualChildren) and not self.hasChildren(parent):
+                return 0 # TreeElement is not created for virtual leaf rows
+            el = self.elementFromIndex(parent)
             if not el.loaded:
-                self.createChildren(el)
+                if not self.hasChildren(parent): # e.g. attributes of unexpandable types are not listed
+                    return 0
+                self.loadChildren(el)
+                if self._sort_column is not None:
+                    self._sortLevel(el)
         rc = len(el.children)
         return rc
+    def loadChildren(self,el):
+        """
+        called when a view requests children of not loaded element, by default creates them immediately
+        """
+        self.createChildren(el)
+    def _addChildren(self,el,children):
+        """
+        adds children (iterable of TreeElement) to el,
+        if fetch_batch is set only first batch is added, the rest is loaded by fetchMore
+        """
+        if self.fetch_batch:
+            el.pending = iter(children)
+            el.children.extend(islice(el.pending, self.fetch_batch))
+            if len(el.children) < self.fetch_batch:
+                el.pending = None
+        else:
+            el.children.extend(children)
+    def _addVirtualChildren(self,el):
+        """
+        replaces el.children with VirtualChildren if virtual_children is on and el.value is indexable
+        :return: True if children are virtual
+        """
+        if not self.virtual_children:
+            return False
+        obj = el.value
+        if isinstance(obj,Mapping):
+            el.children = VirtualChildren(el,list(obj.keys()))
+        elif isinstance(obj,Sequence) and not isinstance(obj,(str,bytes,bytearray)) \
+                or hasattr(obj,"shape") and hasattr(obj,"dtype") and len(obj.shape)>0: #numpy arrays
+            el.children = VirtualChildren(el)
+        else:
+            return False
+        return True
+    def canFetchMore(self, parent):
+        if parent.column() > 0: # only the first column has children
+            return False
+        el = self.elementFromIndex(parent)
+        return el.pending is not None
+    def fetchMore(self, parent):
+        if parent.column() > 0:
+            return
+        el = self.elementFromIndex(parent)
+        if el.pending is None:
+            return
+        batch = list(islice(el.pending, self.fetch_batch))
+        if len(batch) < self.fetch_batch:
+            if self.nodes is not None:
+                del self.nodes.pending[el.id]
+            else:
+                el.pending = None
+        if batch:
+            n = len(el.children) if self.nodes is None else len(self.nodes.children[el.id])
+            self.beginInsertRows(parent, n, n + len(batch) - 1)
+            if self.nodes is not None:
+                self.nodes.addChildren(el.id,batch)
+            else:
+                el.children.extend(batch)
+            self.endInsertRows()
+    def refresh(self,obj = _MISSING):
+        """
+        re-reads loaded part of the tree and updates views with rowsRemoved/rowsInserted/dataChanged
+        instead of model reset, so expanded branches stay expanded
+        children are matched by name (or by identity of value, if name is not hashable)
+        :param obj: new object to show, by default current object is re-scanned
+        """
+        if obj is not _MISSING:
+            self.object = obj
+        if self.display_cache is not None:
+            self.display_cache.clear()
+        if self.nodes is not None: # nodes can not be removed from compact store in place
+            self.beginResetModel()
+            self._init_data()
+            if self._sort_column is not None:
+                self._sortNode(0)
+            self.endResetModel()
+            return
+        self.el0.value = self.object
+        self._refreshElement(self.el0,QtCore.QModelIndex())
+    @staticmethod
+    def _childKeys(children):
+        keys = []
+        seen = {}
+        for c in children:
+            k = c.name if isinstance(c.name,Hashable) else id(c.value)
+            n = seen.get(k,0)
+            seen[k] = n + 1
+            keys.append((k,n))
+        return keys
+    @staticmethod
+    def _reparent(children,el):
+        for c in children:
+            c.parent = el
+            yield c
+    def _refreshElement(self,el,index):
+        if not el.loaded:
+            return
+        tmp = TreeElement(el.value)
+        self.createChildren(tmp)
+        old, new = el.children, tmp.children
+        if isinstance(old,VirtualChildren) and isinstance(new,VirtualChildren):
+            self._refreshVirtual(el,index,new)
+            return
+        if isinstance(old,VirtualChildren) or isinstance(new,VirtualChildren):
+            self._replaceChildren(el,index,tmp)
+            return
+        if tmp.pending is not None: # rows which were already fetched are compared too
+            new.extend(islice(tmp.pending,max(0,len(old)-len(new))))
+            el.pending = self._reparent(tmp.pending,el)
+        else:
+            el.pending = None
+        if self._sort_column is not None:
+            if tmp.pending is not None:
+                new.extend(tmp.pending)
+                el.pending = None
+            new[:] = self._sortedElements(new)
+        old_keys = self._childKeys(old)
+        new_keys = self._childKeys(new)
+        new_set = set(new_keys)
+        row = len(old) - 1
+        while row >= 0: # remove rows which are gone, by contiguous ranges
+            if old_keys[row] in new_set:
+                row -= 1
+                continue
+            last = row
+            while row >= 0 and old_keys[row] not in new_set:
+                row -= 1
+            self.beginRemoveRows(index,row + 1,last)
+            self._elementsRemoved(old[row + 1:last + 1])
+            del old[row + 1:last + 1]
+            del old_keys[row + 1:last + 1]
+            self.endRemoveRows()
+        old_set = set(old_keys)
+        if [k for k in new_keys if k in old_set] != old_keys: # order has changed
+            self._replaceChildren(el,index,tmp)
+            return
+        changed = []
+        row = 0
+        while row < len(new):
+            if new_keys[row] in old_set:
+                signature = self._valueSignature(new[row].value)
+                if old[row].value is not new[row].value or old[row].signature != signature:
+                    old[row].value = new[row].value
+                    changed.append(row)
+                old[row].signature = signature
+                old[row].index = row
+                row += 1
+                continue
+            first = row
+            while row < len(new) and new_keys[row] not in old_set:
+                new[row].parent = el
+                row += 1
+            self.beginInsertRows(index,first,row - 1)
+            old[first:first] = new[first:row]
+            self.endInsertRows()
+        self._emitRowsChanged(index,changed)
+        for row,child in enumerate(old):
+            child.index = row
+            child.parent_index = index # rows of the parent may have been shifted
+            if child.loaded:
+                self._refreshElement(child,self.index(row,0,index))
+    @staticmethod
+    def _valueSignature(val):
+        """
+        cheap signature of value, which can be changed in place (e.g. list shown as "[n items]"),
+        rows with the same value object are updated by refresh if the signature differs, None for other values
+        """
+        if isinstance(val,Collection) and not isinstance(val,(str,bytes,bytearray)):
+            try:
+                return len(val)
+            except Exception:
+                return None
+        return None
+    def _elementsRemoved(self,elements):
+        """
+        called by refresh for removed rows (and their subtrees), e.g. to cancel their background work
+        """
+        pass
+    def _refreshVirtual(self,el,index,new):
+        vc = el.children
+        if vc.order is not None: # sorted, rows can not be matched by position
+            tmp = new.parent
+            self._replaceChildren(el,index,tmp)
+            return
+        if vc.keys is None and new.keys is None:
+            p = min(vc.count,new.count)
+        elif vc.keys is None or new.keys is None:
+            p = 0
+        else:
+            p = 0
+            while p < min(vc.count,new.count) and vc.keys[p] == new.keys[p]:
+                p += 1
+        if p < vc.count:
+            self.beginRemoveRows(index,p,vc.count - 1)
+            vc.count = p
+            removed = [r for r in vc.items if r >= p]
+            self._elementsRemoved([vc.items[r] for r in removed])
+            for row in removed:
+                del vc.items[row]
+            self.endRemoveRows()
+        vc.keys = new.keys
+        if new.count > p:
+            self.beginInsertRows(index,p,new.count - 1)
+            vc.count = new.count
+            self.endInsertRows()
+        for row,child in sorted(vc.items.items()):
+            val = el.value[row] if vc.keys is None else el.value[vc.keys[row]]
+            if child.value is not val:
+                child.value = val
+            if child.loaded:
+                self._refreshElement(child,self.index(row,0,index))
+        self._emitRowsChanged(index,range(p))
+    def _replaceChildren(self,el,index,tmp):
+        if len(el.children):
+            self.beginRemoveRows(index,0,len(el.children) - 1)
+            old = el.children
+            self._elementsRemoved(old.items.values() if isinstance(old,VirtualChildren) else old)
+            el.children = []
+            el.pending = None
+            self.endRemoveRows()
+        if self._sort_column is not None:
+            self._sortLevel(tmp)
+        new = tmp.children
+        if isinstance(new,VirtualChildren):
+            new.parent = el
+        else:
+            for c in new:
+                c.parent = el
+        pending = self._reparent(tmp.pending,el) if tmp.pending is not None else None
+        if len(new):
+            self.beginInsertRows(index,0,len(new) - 1)
+            el.children = new
+            el.pending = pending
+            self.endInsertRows()
+        else:
+            el.children = new
+            el.pending = pending
+    def _emitRowsChanged(self,parent,rows):
+        """
+        emits dataChanged for given rows, joining contiguous rows into one range
+        """
+        if not rows:
+            return
+        last_col = self.columnCount(parent) - 1
+        rows = list(rows)
+        first = prev = rows[0]
+        for row in rows[1:] + [None]:
+            if row is not None and row == prev + 1:
+                prev = row
+                continue
+            self.dataChanged.emit(self.index(first,0,parent),self.index(prev,last_col,parent))
+            first = prev = row
+    def valueHasChildren(self,val):
+        """
+        returns True if element with this value can be expanded
+        """
+        return isinstance(val, Collection) and not isinstance(val,(str,bytes,bytearray))
+    def childItems(self,val):
+        """
+        yields (name, value) of children of the value with the names used in the tree,
+        it is called by ObjectSearchIndex in a worker thread, so it must not use createChildren or model state
+        """
+        if isinstance(val,Mapping):
+            yield from val.items()
+        elif hasattr(val,"__iter__") and not isinstance(val,(str,bytes,bytearray)):
+            for i,v in enumerate(val):
+                yield "[{}]".format(i), v
+    def indexForPath(self,path):
+        """
+        returns index of the element found by names from the root,
+        only ancestors of the element are loaded, invalid index is returned if the path is not found
+        """
+        index = QtCore.QModelIndex()
+        for name in path:
+            el = self.elementFromIndex(index)
+            if self.nodes is None and not el.loaded:
+                self.createChildren(el) # not loadChildren, asynchronous loading would show placeholder
+            self.rowCount(index)
+            row = self._findChildRow(index,name)
+            if row is None:
+                return QtCore.QModelIndex()
+            index = self.index(row,0,index)
+        return index
+    def _findChildRow(self,index,name):
+        children = self.elementFromIndex(index).children
+        if isinstance(children,VirtualChildren):
+            if children.keys is not None:
+                src = children.keys.index(name) if name in children.keys else None
+            else:
+                src = int(name[1:-1])
+                src = src if src < len(children) else None
+            return None if src is None else children.viewRow(src) # rows may be sorted
+        start = 0
+        while True:
+            for row in range(start,len(children)):
+                if children[row].name == name:
+                    return row
+            if not self.canFetchMore(index):
+                return None
+            start = len(children)
+            self.fetchMore(index)
+            children = self.elementFromIndex(index).children
+    def buildSearchIndex(self,max_depth = 8,max_nodes = 1000000):
+        """
+        starts building of search index in a background thread
+        :return: ObjectSearchIndex, its signals sigProgress and sigFinished can be used to show progress
+        """
+        if self.search_index is not None:
+            self.search_index.cancel()
+        self.search_index = ObjectSearchIndex(self,max_depth=max_depth,max_nodes=max_nodes)
+        self.search_index.start()
+        return self.search_index
+    def search(self,text,max_results = 100):
+        """
+        returns indexes of elements which name or value contains text, their parents are loaded,
+        so indexes can be passed to view.scrollTo()
+        search index is built on first call, while it is being built only already indexed part is searched
+        """
+        if self.search_index is None:
+            self.buildSearchIndex()
+        indexes = []
+        for entry in self.search_index.find(text,max_results):
+            index = self.indexForPath(self.search_index.path(entry))
+            if index.isValid():
+                indexes.append(index)
+        return indexes
+    def _valueKey(self,val):
+        if isinstance(val,Real) and not isinstance(val,bool):
+            if val != val: # nan
+                return (1,0,"")
+            return (0,val,"")
+        if isinstance(val,str):
+            return (2,0,val)
+        return (3,0,self.formatValue(val))
+    def sortKey(self,name,val,column):
+        """
+        returns key for sorting a row by the column, it's computed from raw values
+        """
+        if column == self.col_name:
+            return self._valueKey(name)
+        elif column == self.col_type:
+            return type(val).__name__
+        return self._valueKey(val)
+    def sort(self,column,order = QtCore.Qt.AscendingOrder):
+        """
+        sorts children of every loaded level, levels loaded later are sorted when they are loaded,
+        sort key of each row is computed once per level,
+        with fetch_batch all children of a sorted level are loaded
+        negative column stops sorting of newly loaded levels, current order is kept
+        """
+        if column < 0:
+            self._sort_column = None
+            return
+        self._sort_column = column
+        self._sort_reverse = order == QtCore.Qt.DescendingOrder
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        keys = [self._persistentKey(i) for i in persistent]
+        if self.nodes is not None:
+            self._sortNodeTree(0)
+        else:
+            self._sortTree(self.el0,QtCore.QModelIndex())
+        self.changePersistentIndexList(persistent,[self._indexFromPersistentKey(k) for k in keys])
+        if self.display_cache is not None:
+            self.display_cache.clear()
+        self.layoutChanged.emit()
+    def _persistentKey(self,index):
+        if self.nodes is not None:
+            return (index.internalId(),index.column())
+        ptr = index.internalPointer()
+        if isinstance(ptr,VirtualChildren):
+            return (ptr,ptr.sourceRow(index.row()),index.column())
+        return (ptr,index.column())
+    def _indexFromPersistentKey(self,key):
+        if self.nodes is not None:
+            return self.createIndex(self.nodes.row[key[0]],key[1],key[0])
+        if isinstance(key[0],VirtualChildren):
+            return self.createIndex(key[0].viewRow(key[1]),key[2],key[0])
+        return self.createIndex(key[0].index,key[1],key[0])
+    def _sortedElements(self,elements):
+        col = self._sort_column
+        keys = [self.sortKey(el.name,el.value,col) for el in elements]
+        order = sorted(range(len(elements)),key=keys.__getitem__,reverse=self._sort_reverse)
+        elements = [elements[i] for i in order]
+        for row,el in enumerate(elements):
+            el.index = row
+        return elements
+    def _sortLevel(self,el):
+        children = el.children
+        if isinstance(children,VirtualChildren):
+            children.setOrder(self._virtualOrder(children))
+            return
+        if el.pending is not None:
+            children.extend(el.pending)
+            el.pending = None
+        el.children = self._sortedElements(children)
+    def _virtualOrder(self,children):
+        col = self._sort_column
+        n = len(children)
+        obj = children.parent.value
+        if children.keys is None and col == self.col_name: # rows are named by position
+            return range(n-1,-1,-1) if self._sort_reverse else None
+        if children.keys is None and col == self.col_data and getattr(obj,"ndim",0) == 1 \
+                and getattr(obj.dtype,"kind","O") in "biuf": #numeric numpy array
+            order = obj.argsort(kind="stable")
+            return order[::-1] if self._sort_reverse else order
+        keys = [self.sortKey(children._name(src),children._value(src),col) for src in range(n)]
+        return sorted(range(n),key=keys.__getitem__,reverse=self._sort_reverse)
+    def _sortTree(self,el,index):
+        self._sortLevel(el)
+        children = el.children
+        if isinstance(children,VirtualChildren):
+            children.parent_index = index
+            loaded = [(children.viewRow(src),c) for src,c in children.items.items() if c.loaded]
+        else:
+            for c in children:
+                c.parent_index = index
+            loaded = [(row,c) for row,c in enumerate(children) if c.loaded]
+        for row,c in loaded:
+            self._sortTree(c,self.index(row,0,index))
+    def _sortNode(self,node_id):
+        nodes = self.nodes
+        col = self._sort_column
+        if node_id in nodes.pending:
+            tmp = [c for c in nodes.pending.pop(node_id)]
+            nodes.addChildren(node_id,tmp)
+        children = nodes.children[node_id]
+        keys = {c:self.sortKey(nodes.names[c],nodes.values[c],col) for c in children}
+        children = array("q",sorted(children,key=keys.__getitem__,reverse=self._sort_reverse))
+        nodes.children[node_id] = children
+        for row,c in enumerate(children):
+            nodes.row[c] = row
+    def _sortNodeTree(self,node_id):
+        self._sortNode(node_id)
+        for c in self.nodes.children[node_id]:
+            if self.nodes.loaded[c]:
+                self._sortNodeTree(c)
+    def invalidateDisplayCache(self,index = None):
+        """
+        drops cached display strings
+        :param index: if given, only the row of this index is dropped and dataChanged is emitted for it,
+            otherwise the whole cache is cleared
+        """
+        if self.display_cache is None:
+            return
+        if index is None or not index.isValid():
+            self.display_cache.clear()
+            return
+        ncol = self.columnCount(index.parent())
+        for col in range(ncol):
+            idx = index.sibling(index.row(),col)
+            self.display_cache.pop((idx.internalId(),idx.row(),col))
+        self.dataChanged.emit(index.sibling(index.row(),0),index.sibling(index.row(),ncol-1))
+    def arraySummary(self,val,index = None):
+        """
+        returns summary text of numeric array or None if it is not computed yet (or not enabled),
+        if index is given, dataChanged is emitted for it when summary is ready
+        """
+        if self.array_summary is None or not ArraySummary.supported(val):
+            return None
+        summary = self.array_summary.get(val)
+        if summary is not None:
+            return self.array_summary.text(summary)
+        if index is not None:
+            waiting = self._summary_waiting.setdefault(id(val),[])
+            persistent = QtCore.QPersistentModelIndex(index)
+            if persistent not in waiting:
+                waiting.append(persistent)
+        return None
+    def _onSummaryReady(self,arr):
+        for persistent in self._summary_waiting.pop(id(arr),()):
+            if not persistent.isValid():
+                continue
+            index = self.index(persistent.row(),persistent.column(),persistent.parent())
+            if self.display_cache is not None:
+                self.invalidateDisplayCache(index)
+            else:
+                self.dataChanged.emit(index,index)
     def formatValue(self, val):
         if val is None:
             ret = "None"
@@ -137,8 +1209,11 @@ class PythonTreeModelBase(QtCore.QAbstractItemModel):
 
 
 class PythonCollectionTreeModel(PythonTreeModelBase):
-    def __init__(self,obj,col_type = 1,encoding = None):
-        super().__init__(obj,col_type=col_type,encoding=encoding)
+    def __init__(self,obj,col_type = 1,encoding = None, fetch_batch = None, virtual_children = False,
+                 compact_nodes = False, display_cache_size = 0, array_summary = None):
+        super().__init__(obj,col_type=col_type,encoding=encoding,fetch_batch=fetch_batch,
+                         virtual_children=virtual_children,compact_nodes=compact_nodes,
+                         display_cache_size=display_cache_size,array_summary=array_summary)
         if isinstance(self.object,Mapping):
             self.mode = self.MODE.MAP
             self.col_name = 0
@@ -160,39 +1235,39 @@ class PythonCollectionTreeModel(PythonTreeModelBase):
 
     def createChildren(self,el):
         obj = el.value
-        if isinstance(obj,Mapping):
-            for i,(k, val) in enumerate(obj.items()):
-                    # child = TreeElement(val, name=repr(k)+":", parent=el, index=i)
-                    child = TreeElement(val, name=k, parent=el, index=i)
-                    el.children.append(child)
+        if self._addVirtualChildren(el):
+            pass
+        elif isinstance(obj,Mapping):
+            # child = TreeElement(val, name=repr(k)+":", parent=el, index=i)
+            self._addChildren(el,(TreeElement(val, name=k, parent=el, index=i)
+                                  for i,(k, val) in enumerate(obj.items())))
         elif hasattr(obj,"__iter__") and not isinstance(obj,(str,bytes,bytearray,dict)):
-            for i,val in enumerate(obj):
-                child = TreeElement(val, name="[{}]".format(i), parent=el, index=i)
-                el.children.append(child)
+            self._addChildren(el,(TreeElement(val, name="[{}]".format(i), parent=el, index=i)
+                                  for i,val in enumerate(obj)))
         el.loaded = True
 
     def hasChildren(self, parent=None, *args, **kwargs):
-        if parent.isValid():
-            el = parent.internalPointer()
-        else:
-            el = self.el0
-        if isinstance(el.value, Collection) and not isinstance(el.value,(str,bytes,bytearray)) \
-                and not hasattr(el.value,"shape"):
+        return self.valueHasChildren(self.valueFromIndex(parent))
+    def valueHasChildren(self,val):
+        if isinstance(val, Collection) and not isinstance(val,(str,bytes,bytearray)) \
+                and not hasattr(val,"shape"):
             return True
         else:
             return False
+    @cached_display
     def data(self,index, role):
         col = index.column()
         row = index.row()
         if role==QtCore.Qt.DisplayRole:
+            # elements of virtual rows are not created for painting, only for expanded rows
             if self.mode == self.MODE.MAP:
                 if col==self.col_data:
-                    val = index.internalPointer().value
-                    return self.formatValue(val)
+                    val = self.valueFromIndex(index)
+                    return self._formatWithSummary(val,index)
                 elif col==self.col_name:
-                    return index.internalPointer().name
+                    return self.nameFromIndex(index)
                 elif col==self.col_type:
-                    return type(index.internalPointer().value).__name__
+                    return type(self.valueFromIndex(index)).__name__
                 else:
                     return row,col
             # elif self.mode == self.MODE.ARRAY:
@@ -200,13 +1275,21 @@ class PythonCollectionTreeModel(PythonTreeModelBase):
             # elif self.mode == self.MODE.DATAFRAME:
             #     return str(self.object.iloc[row,col])
             else:
-                val = index.internalPointer().value
-                return self.formatValue(val)
+                val = self.valueFromIndex(index)
+                return self._formatWithSummary(val,index)
         elif role==QtCore.Qt.ToolTipRole:
             if col==self.col_data:
-                val = index.internalPointer().value
+                val = self.valueFromIndex(index)
                 if isinstance(val,(str,bytes)):
                     return str(val)
+                return self.arraySummary(val)
+    def _formatWithSummary(self,val,index):
+        text = self.formatValue(val)
+        if self.array_summary is not None and ArraySummary.supported(val) and val.size > self.inline_items:
+            summary = self.arraySummary(val,index)
+            if summary:
+                text += "; " + summary
+        return text
     def headerData(self,section,orient,role):
         if orient == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
             if section == self.col_data:
@@ -217,53 +1300,352 @@ class PythonCollectionTreeModel(PythonTreeModelBase):
                 return 'type'
 
 class PythonArrayTreeModel(PythonTreeModelBase):
-    def __init__(self,obj):
+    def __init__(self,obj, virtual_children = False, fmt = None, tile_rows = 256, tile_cols = 16,
+                 tile_cache_size = 64, slice_axes = None, array_summary = None):
+        """
+        :param fmt: printf-style format for numbers, e.g. "%.3g" or "%.4e", by default str() is used
+        :param tile_rows, tile_cols: cells are formatted by blocks of this size, all at once
+        :param tile_cache_size: number of formatted blocks to keep, 0 formats every cell separately
+        :param slice_axes: (row_axis, col_axis) to show 2d slice of n-dimensional array, see setSlice
+        :param array_summary: True or ArraySummary, summary of the column is shown in tooltip of the header
+        """
         self.dataframe = hasattr(obj,"iloc")
-        super().__init__(obj)
+        self._order = None # row permutation set by sort()
+        self._initColumns(obj)
+        self.fmt = fmt
+        self.tile_rows = tile_rows
+        self.tile_cols = tile_cols
+        if tile_cache_size and numpy is not None:
+            self.tile_cache = LRUCache(tile_cache_size)
+        else:
+            self.tile_cache = None
+        self.array = obj # whole array, object is the slice of it if slice is set
+        self.slice = None
+        self._summary_columns = {} # column -> array, so summary is cached for the same array
+        if numpy is not None and isinstance(obj,numpy.memmap):
+            virtual_children = True # rows of memmap are not touched until shown
+        super().__init__(obj, virtual_children=virtual_children, array_summary=array_summary)
+        if slice_axes is not None:
+            self.setSlice(*slice_axes)
     def columnCount(self, parent=None, *args, **kwargs):
-        if self.object.ndim<=1:
+        if self.columns is not None:
+            return len(self.columns)
+        elif self.object.ndim<=1:
             return 1
         else:
             return self.object.shape[-1]
     def data(self,index, role):
-        col = index.column()
-        row = index.row()
         if role in (QtCore.Qt.DisplayRole,QtCore.Qt.ToolTipRole):
-            if self.object.ndim>1:
-                if self.dataframe:
-                    return str(self.object.iloc[row, col])
+            if self.tile_cache is not None and (self.columns is not None or self.object.ndim <= 2):
+                return self._tileText(index.row(),index.column())
+            col = index.column()
+            row = self._sourceRow(index.row())
+            if self.columns is not None:
+                return str(self._cell(row,col))
+            elif self.object.ndim>1:
+                return str(self.object[row,col])
+            else:
+                return str(self.object[row])
+    def headerData(self,section,orient,role):
+        if role == QtCore.Qt.ToolTipRole and orient == QtCore.Qt.Horizontal and self.array_summary is not None:
+            if self.columns is not None and self.columns[section][1] is not None:
+                return None # categorical
+            values = self._summary_columns.get(section)
+            if values is None:
+                values = self._summary_columns[section] = self._columnValues(section)
+            return self.arraySummary(values)
+        if role == QtCore.Qt.DisplayRole and self.columns is not None:
+            if orient == QtCore.Qt.Horizontal:
+                return self.column_names[section]
+            if self.row_labels is not None:
+                return str(self.row_labels[self._sourceRow(section)])
+        if orient == QtCore.Qt.Vertical and role == QtCore.Qt.DisplayRole and self._order is not None:
+            return self._sourceRow(section) + 1 # rows keep their numbers after sorting, 1-based as before it
+        return super().headerData(section,orient,role)
+    def setSlice(self,row_axis = 0,col_axis = 1,indices = None):
+        """
+        shows 2d slice of n-dimensional array, the slice is a numpy view,
+        so np.memmap is read only where cells are shown
+        :param row_axis: axis shown as rows, None shows the whole array again
+        :param col_axis: axis shown as columns, None shows one column
+        :param indices: indices of other axes, dict axis -> index or sequence with item for each axis
+                        (items of row and column axes are ignored), other axes are at 0 by default
+        """
+        self.beginResetModel()
+        if row_axis is None:
+            self.slice = None
+            self.object = self.array
+        else:
+            ndim = self.array.ndim
+            if isinstance(indices,Mapping):
+                indices = [indices.get(a,0) for a in range(ndim)]
+            elif indices is None:
+                indices = [0]*ndim
+            indices = list(indices)
+            row_axis %= ndim
+            if col_axis is not None:
+                col_axis %= ndim
+            key = tuple(slice(None) if a in (row_axis,col_axis) else int(indices[a]) for a in range(ndim))
+            view = self.array[key] # basic indexing gives view, no data is read
+            if col_axis is not None and col_axis < row_axis:
+                view = view.T
+            self.slice = (row_axis,col_axis,indices)
+            self.object = view
+            self.virtual_children = True
+        self._order = None
+        self._summary_columns = {}
+        if self.tile_cache is not None:
+            self.tile_cache.clear()
+        if self.display_cache is not None:
+            self.display_cache.clear()
+        self._init_data()
+        self.endResetModel()
+    def setSliceIndex(self,axis,index):
+        """
+        moves fixed axis of the slice to the index
+        """
+        row_axis,col_axis,indices = self.slice
+        indices = list(indices)
+        indices[axis] = index
+        self.setSlice(row_axis,col_axis,indices)
+    def _onSummaryReady(self,arr):
+        super()._onSummaryReady(arr)
+        if any(v is arr for v in self._summary_columns.values()):
+            self.headerDataChanged.emit(QtCore.Qt.Horizontal,0,self.columnCount()-1)
+    def _initColumns(self,obj):
+        """
+        takes column arrays of DataFrame (or Series), structured array or pyarrow.Table once,
+        cells are read from them directly, without per row objects
+        categorical column is kept as codes and categories
+        for other objects columns is None
+        """
+        self.row_labels = None
+        if self.dataframe:
+            series = [obj.iloc[:,i] for i in range(obj.shape[1])] if obj.ndim > 1 else [obj]
+            self.columns = []
+            for s in series:
+                if hasattr(s,"cat"): # categorical
+                    self.columns.append((s.cat.codes.to_numpy(),s.cat.categories.to_numpy()))
                 else:
-                    return str(self.object[row,col])
+                    self.columns.append((s.to_numpy(),None))
+            if obj.ndim > 1:
+                self.column_names = [str(c) for c in obj.columns]
             else:
-                if self.dataframe:
-                    return str(self.object.iloc[row])
+                self.column_names = [str(obj.name)]
+            self.row_labels = obj.index.to_numpy()
+        elif getattr(getattr(obj,"dtype",None),"names",None): # structured array, fields are views
+            self.columns = [(obj[name],None) for name in obj.dtype.names]
+            self.column_names = list(obj.dtype.names)
+        elif hasattr(obj,"column_names") and hasattr(obj,"num_rows"): # pyarrow.Table
+            self.columns = [(ArrowColumn(c),None) for c in obj.columns]
+            self.column_names = list(obj.column_names)
+        else:
+            self.columns = None
+    def _cell(self,row,col):
+        values,categories = self.columns[col]
+        if categories is None:
+            return values[row]
+        code = values[row]
+        return categories[code] if code >= 0 else numpy.nan
+    def _takeColumn(self,col,rows):
+        """
+        :return: array of column values for rows (slice or array of row numbers)
+        """
+        values,categories = self.columns[col]
+        if categories is None:
+            return values[rows]
+        codes = values[rows]
+        taken = categories[codes]
+        missing = codes < 0
+        if missing.any():
+            taken = taken.astype(object)
+            taken[missing] = numpy.nan
+        return taken
+    def _sourceRow(self,row):
+        return row if self._order is None else int(self._order[row])
+    def _tileText(self,row,col):
+        key = (row // self.tile_rows, col // self.tile_cols)
+        tile = self.tile_cache.get(key)
+        if tile is None:
+            tile = self._formatTile(*key)
+            self.tile_cache.put(key,tile)
+        return tile[row % self.tile_rows][col % self.tile_cols]
+    def _formatTile(self,tile_row,tile_col):
+        """
+        formats block of cells at once, returns list of rows of strings
+        """
+        r0 = tile_row*self.tile_rows
+        r1 = min(r0 + self.tile_rows,len(self.object))
+        c0 = tile_col*self.tile_cols
+        c1 = min(c0 + self.tile_cols,self.columnCount())
+        rows = slice(r0,r1) if self._order is None else self._order[r0:r1]
+        if self.columns is not None: # columns are formatted separately, they may have different types
+            text = []
+            for c in range(c0,c1):
+                values = self._takeColumn(c,rows)
+                if values.ndim > 1: # field of structured array with shape
+                    text.append([str(v) for v in values])
                 else:
-                    return str(self.object[row])
+                    text.append(self.formatBlock(values).tolist())
+            return [list(r) for r in zip(*text)]
+        return self.formatBlock(self._readBlock(rows,c0,c1)).tolist()
+    def _readBlock(self,rows,c0,c1):
+        """
+        :param rows: slice or array of row numbers
+        :return: 2d array of values of rows and columns c0:c1
+        """
+        if self.object.ndim > 1:
+            return self.object[rows,c0:c1]
+        return self.object[rows].reshape(-1,1)
+    def formatBlock(self,block):
+        """
+        converts 2d array to array of strings, it can be reimplemented for custom formatting
+        """
+        if self.fmt and block.dtype.kind in "biuf":
+            return numpy.char.mod(self.fmt,block)
+        return block.astype(str)
+    def setFormat(self,fmt):
+        """
+        changes number format and updates views
+        """
+        self.fmt = fmt
+        self.invalidateDisplayCache()
+    def invalidateDisplayCache(self,index = None):
+        """
+        drops formatted cells, views are updated
+        """
+        if self.tile_cache is not None:
+            self.tile_cache.clear()
+        super().invalidateDisplayCache(index)
+        if index is None and len(self.object):
+            self.dataChanged.emit(self.index(0,0,QtCore.QModelIndex()),
+                                  self.index(len(self.object)-1,self.columnCount()-1,QtCore.QModelIndex()))
+    def _columnValues(self,column):
+        if self.columns is not None:
+            values = self.columns[column][0] # categorical column is sorted by codes, i.e. in order of categories
+            return values[:] if isinstance(values,ArrowColumn) else values
+        elif self.object.ndim>1:
+            return self.object[:,column]
+        return self.object
+    def sort(self,column,order = QtCore.Qt.AscendingOrder):
+        """
+        sorts rows by values of the column using vectorized argsort, data is not moved,
+        the view sees rows through permutation, negative column restores natural order
+        """
+        if column < 0:
+            new_order = None
+        else:
+            values = self._columnValues(column)
+            if values.ndim != 1:
+                return
+            try:
+                new_order = values.argsort(kind="stable")
+            except TypeError: # mixed types in object column
+                keys = [self._valueKey(v) for v in values]
+                new_order = sorted(range(len(values)),key=keys.__getitem__)
+            if order == QtCore.Qt.DescendingOrder:
+                new_order = new_order[::-1]
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        src = [self._sourceRow(i.row()) for i in persistent]
+        self._order = new_order
+        if new_order is not None:
+            inverse = _inverse_permutation(new_order)
+            new_rows = [int(inverse[r]) for r in src]
+        else:
+            new_rows = src
+        self.changePersistentIndexList(persistent,
+                                       [self.index(r,i.column(),i.parent()) for r,i in zip(new_rows,persistent)])
+        if self.tile_cache is not None:
+            self.tile_cache.clear()
+        self.layoutChanged.emit()
+    def childItems(self,val):
+        if self.columns is not None and val is self.el0.value: # rows of the table
+            tmp = TreeElement(val)
+            if self.dataframe:
+                rows = DataFrameRows(tmp)
+            elif hasattr(val,"num_rows"):
+                rows = ArrowTableRows(tmp)
+            else:
+                rows = VirtualChildren(tmp)
+            for src in range(len(rows)):
+                yield rows._name(src), rows._value(src)
+            return
+        yield from super().childItems(val)
     def createChildren(self,el):
         obj = el.value
-        if hasattr(obj,"__iter__") and not isinstance(obj,(str,bytes,bytearray,dict)):
-            if self.dataframe: #pandas dataframe
-                for i in range(len(obj)):
-                    child = TreeElement(obj.iloc[i], parent=el, index=i)
-                    el.children.append(child)
+        if self.columns is not None and el is self.el0: # no objects are created for rows
+            if self.dataframe:
+                el.children = DataFrameRows(el)
+            elif hasattr(obj,"num_rows"): # pyarrow.Table
+                el.children = ArrowTableRows(el)
+            else:
+                el.children = VirtualChildren(el)
+        elif hasattr(obj,"__iter__") and not isinstance(obj,(str,bytes,bytearray,dict)):
+            if self._addVirtualChildren(el):
+                pass
             else: #numpy array
                 for i,val in enumerate(obj):
                     child = TreeElement(val, parent=el, index=i)
                     el.children.append(child)
         el.loaded = True
+    def refresh(self,obj = _MISSING):
+        self._summary_columns = {}
+        self._order = None # rows of new data are not sorted
+        if self.slice is not None:
+            if obj is not _MISSING:
+                self.array = obj
+            return self.setSlice(*self.slice)
+        if obj is not _MISSING:
+            self.array = obj
+        if self.columns is None:
+            if self.tile_cache is not None: # formatted cells of old data
+                self.tile_cache.clear()
+            return super().refresh(obj)
+        # columns are taken once, so the model is reset
+        self.beginResetModel()
+        if obj is not _MISSING:
+            self.object = obj
+        self._initColumns(self.object)
+        self._order = None
+        if self.tile_cache is not None:
+            self.tile_cache.clear()
+        self._init_data()
+        self.endResetModel()
     def hasChildren(self, parent=None, *args, **kwargs):
-        if parent.isValid():
-            el = parent.internalPointer()
-        else:
-            el = self.el0
-        if hasattr(el.value,"ndim") and el.value.ndim>1:
+        if self.columns is not None:
+            return not parent.isValid()
+        val = self.valueFromIndex(parent)
+        if hasattr(val,"ndim") and val.ndim>1:
             return True
         else:
             return False
 
 class PythonObjectTreeModel(PythonTreeModelBase):
+    sigChildrenListed = QtCore.Signal(object, object)
+    sigValueResolved = QtCore.Signal(object, object)
     def __init__(self,obj,hidetypes = (),do_not_expand_types = None,show_double_underscore = True,
-                 show_under_score = True, exclude_patterns = []):
+                 show_under_score = True, exclude_patterns = [], compact_nodes = False,
+                 display_cache_size = 0, async_expand = False, async_workers = 4,
+                 lazy_attributes = False, attr_budget = None):
+        """
+        :param async_expand: if True, attributes of expanded node are listed in a worker thread,
+            meanwhile node shows single "loading..." row,
+            connect view's collapsed signal to cancelLoading to drop the work for collapsed nodes
+        :param async_workers: number of worker threads used with async_expand and attr_budget
+        :param lazy_attributes: if True, only attribute names are listed when node is expanded,
+            getattr is called when type or value column is shown for the first time,
+            hidetypes are checked against static attribute (so properties are not evaluated)
+        :param attr_budget: time in seconds, if evaluation of lazy attribute takes longer
+            "evaluating..." is shown, the value is updated when it's ready
+        """
+        self.async_expand = async_expand and not compact_nodes
+        self.async_workers = async_workers
+        self.lazy_attributes = lazy_attributes and not compact_nodes
+        self.attr_budget = attr_budget
+        self._executor = None
+        self._jobs = {} # TreeElement -> (future, cancel event)
+        self._evaluating = {} # TreeElement -> future of slow lazy attribute
         self.hidetypes = hidetypes
         if type(exclude_patterns)==str:
             self.exclude_patterns = [exclude_patterns]
@@ -274,111 +1656,251 @@ class PythonObjectTreeModel(PythonTreeModelBase):
         if not show_double_underscore:
             self.exclude_patterns.append("^__")
         self._createExcludePattern()
-        super().__init__(obj)
+        super().__init__(obj, compact_nodes=compact_nodes, display_cache_size=display_cache_size)
+        self.col_name, self.col_type, self.col_data = 0, 1, 2
 # self.dict_obj = {-1:self.object}
         # self.parents = {}
         self._init_data()
+        self.sigChildrenListed.connect(self._onChildrenListed, QtCore.Qt.QueuedConnection)
+        self.sigValueResolved.connect(self._onValueResolved, QtCore.Qt.QueuedConnection)
         if do_not_expand_types is None:
             self.do_not_expand_types = tuple(typ for typ in DEFAULT_UNEXPANDABLE_TYPES if typ)
         else:
             self.do_not_expand_types = do_not_expand_types
 
     def _createExcludePattern(self):
+        self._type_attrs = {} # type -> (filtered attribute names, set of them)
         if self.exclude_patterns:
             self.exclude_pat = re.compile("|".join(self.exclude_patterns))
         else:
             self.exclude_pat = None
 
-    def _init_data(self):
-        self.el0 = TreeElement(self.object)
-        self.createChildren(self.el0)
-
     def createChildren(self,el):
         # print("loading",el.value)
+        self._resolveValue(el,wait=True)
+        el.children.extend(self._iterChildren(el))
+        el.loaded = True
+    def _iterChildren(self,el):
         obj = el.value
         if isinstance(obj,dict):
             for i,(k, val) in enumerate(obj.items()):
                 if not isinstance(val, self.hidetypes):
                     # child = TreeElement(val, name=repr(k)+":", parent=el, index=i)
-                    child = TreeElement(val, name=k, parent=el, index=i)
-                    el.children.append(child)
+                    yield TreeElement(val, name=k, parent=el, index=i)
         elif hasattr(obj,"__iter__") and not isinstance(obj,(str,bytes,bytearray,dict)):
             for i,val in enumerate(obj):
                 if not isinstance(val, self.hidetypes):
-                    child = TreeElement(val, name="[{}]".format(i), parent=el, index=i)
-                    el.children.append(child)
-        for i,a in enumerate(dir(obj)):
-            val = getattr(obj,a)
+                    yield TreeElement(val, name="[{}]".format(i), parent=el, index=i)
+        for i,a in enumerate(self._attributeNames(obj)):
+            if self.lazy_attributes:
+                val = _UNRESOLVED
+                if self.hidetypes and isinstance(inspect.getattr_static(obj,a,None),self.hidetypes):
+                    continue
+            else:
+                val = getattr(obj,a)
             if not isinstance(val,self.hidetypes):
-                if not self.exclude_pat or not self.exclude_pat.match(a):
-                    child = TreeElement(val,name=a,parent=el,index = i)
-                    el.children.append(child)
-        el.loaded = True
-    def index(self, row, col, parent=None, *args, **kwargs):
-        # print("index",row,col,"parent",parent.row(),parent.column(),end="")
-        if not parent.isValid():
-            par_el = self.el0
-        else:
-            par_el = parent.internalPointer()
-        cur_el = par_el.children[row]
-        index = self.createIndex(row, col,cur_el)
-        cur_el.parent_index = parent
-        # print("->",index.row(),cur_el.name)
-        return index
-    def parent(self, index=None):
-        # print("parent", index.row(), index.column(),end="")
-        if index.isValid():
-            el = index.internalPointer()
-        else:
-            el = self.el0
-        return el.parent_index
-    def indexForElement(self,el):
-        if el is None or el.parent is None:
-            index = self.createIndex(-1,-1,self.el0)
+                yield TreeElement(val,name=a,parent=el,index = i)
+    def childItems(self,val):
+        """
+        yields (name, value) of children like _iterChildren, lazy attributes are evaluated here,
+        no caches of the model are used, so it can run in the search worker thread
+        """
+        if isinstance(val,dict):
+            items = val.items()
+        elif hasattr(val,"__iter__") and not isinstance(val,(str,bytes,bytearray)):
+            items = (("[{}]".format(i),v) for i,v in enumerate(val))
         else:
-            index = self.indexForElement(el.parent)
-        return index
-    def rowCount(self, parent=None, *args, **kwargs):
-        row = parent.row()
-        col = parent.column()
-        if not parent.isValid():
-            el = self.el0
+            items = ()
+        for name,v in items:
+            if not isinstance(v,self.hidetypes):
+                yield name, v
+        for a in dir(val):
+            if self._isExcluded(a):
+                continue
+            v = self._getAttribute(val,a)
+            if not isinstance(v,self.hidetypes):
+                yield a, v
+    def _isExcluded(self,name):
+        return self.exclude_pat is not None and self.exclude_pat.match(name) is not None
+    def _attributeNames(self,obj):
+        """
+        returns sorted attribute names of obj (same as dir(obj)) without names matching exclude_pat,
+        names coming from the type are cached per type, instance __dict__ is checked every time
+        """
+        typ = type(obj)
+        if typ.__dir__ is not object.__dir__: # custom __dir__, e.g. modules and classes
+            return [a for a in dir(obj) if not self._isExcluded(a)]
+        cached = self._type_attrs.get(typ)
+        if cached is None:
+            names = [a for a in dir(typ) if not self._isExcluded(a)]
+            cached = self._type_attrs[typ] = (names,set(names))
+        names, known = cached
+        inst_dict = getattr(obj,"__dict__",None)
+        if not isinstance(inst_dict,dict):
+            return names
+        extra = [k for k in inst_dict if isinstance(k,str) and k not in known and not self._isExcluded(k)]
+        return sorted(names + extra) if extra else names
+    def loadChildren(self,el):
+        self._resolveValue(el,wait=True)
+        if not self.valueHasChildren(el.value): # lazy attribute turned out to be a leaf
+            el.loaded = True
+            return
+        if not self.async_expand:
+            return self.createChildren(el)
+        el.children = [TreeElement(Placeholder("loading..."), name="loading...", parent=el)]
+        el.loaded = True
+        cancelled = threading.Event()
+        self._jobs[el] = (self._submit(self._listChildren,el,cancelled), cancelled)
+    def _submit(self,func,*args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.async_workers)
+        return self._executor.submit(func,*args)
+    def _listChildren(self,el,cancelled):
+        # runs in worker thread, result is sent to GUI thread by sigChildrenListed
+        children = []
+        try:
+            for child in self._iterChildren(el):
+                if cancelled.is_set():
+                    return
+                children.append(child)
+        except Exception as e:
+            children = [TreeElement(Placeholder(repr(e)), name="error", parent=el)]
+        self.sigChildrenListed.emit(el, children)
+    def _onChildrenListed(self,el,children):
+        if self._jobs.pop(el,None) is None: # cancelled
+            return
+        if len(el.children)!=1 or not isinstance(el.children[0].value,Placeholder): # was refreshed meanwhile
+            return
+        try:
+            index = self.indexForElement(el)
+        except ValueError: # row was removed meanwhile
+            return
+        self.beginRemoveRows(index,0,0)
+        el.children = []
+        self.endRemoveRows()
+        if children:
+            if self._sort_column is not None:
+                children = self._sortedElements(children)
+            self.beginInsertRows(index,0,len(children)-1)
+            el.children = children
+            self.endInsertRows()
+    @staticmethod
+    def _getAttribute(obj,name):
+        try:
+            return getattr(obj,name)
+        except Exception as e:
+            return Placeholder(repr(e))
+    def _resolveValue(self,el,wait = False):
+        """
+        evaluates lazy attribute, if it takes longer than attr_budget, "evaluating..." is shown meanwhile
+        :param wait: wait for the value regardless of attr_budget
+        """
+        future = self._evaluating.get(el)
+        if future is None:
+            if el.value is not _UNRESOLVED:
+                return
+            if self.attr_budget is None or wait:
+                el.value = self._getAttribute(el.parent.value,el.name)
+                return
+            future = self._submit(self._getAttribute,el.parent.value,el.name)
+            try:
+                el.value = future.result(timeout=self.attr_budget)
+            except FutureTimeoutError:
+                el.value = Placeholder("evaluating...")
+                self._evaluating[el] = future
+                future.add_done_callback(
+                    lambda f,el=el: f.cancelled() or self.sigValueResolved.emit(el,f.result()))
+        elif wait:
+            del self._evaluating[el]
+            el.value = future.result()
+    def _onValueResolved(self,el,val):
+        if self._evaluating.pop(el,None) is None: # already resolved
+            return
+        el.value = val
+        try:
+            index = self.indexForElement(el)
+        except ValueError: # row was removed meanwhile
+            return
+        if self.display_cache is not None:
+            self.invalidateDisplayCache(index)
         else:
-            el = parent.internalPointer()
-            if not el.loaded:
-                self.createChildren(el)
-        rc = len(el.children)
-        # print("rowcount",row,col,"->",rc)
-        return rc
+            self._emitRowsChanged(index.parent(),[index.row()])
+    def _elementsRemoved(self,elements):
+        """
+        cancels listing of children of removed elements and their descendants
+        """
+        removed = set(elements)
+        for el in list(self._jobs):
+            p = el
+            while p is not None and p not in removed:
+                p = p.parent
+            if p is not None:
+                future, cancelled = self._jobs.pop(el)
+                cancelled.set()
+                future.cancel()
+    def cancelLoading(self,index):
+        """
+        stops listing children of the index (e.g. when it is collapsed),
+        children will be listed again when the index is expanded next time
+        """
+        el = self.elementFromIndex(index)
+        job = self._jobs.pop(el,None)
+        if job is None:
+            return
+        future, cancelled = job
+        cancelled.set()
+        future.cancel()
+        self.beginRemoveRows(index,0,len(el.children)-1)
+        el.children = []
+        self.endRemoveRows()
+        el.loaded = False
+    def shutdown(self):
+        """
+        cancels all pending work and stops worker threads
+        """
+        for future, cancelled in self._jobs.values():
+            cancelled.set()
+            future.cancel()
+        self._jobs.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
     def columnCount(self, parent=None, *args, **kwargs):
         return 3
     def hasChildren(self, parent=None, *args, **kwargs):
         # print("has children",parent.row())
-        if parent.isValid():
-            el = parent.internalPointer()
-        else:
-            el = self.el0
+        el = self.elementFromIndex(parent)
         # return True
         #TODO
-        if isinstance(el.value,self.do_not_expand_types):
+        if el.value is _UNRESOLVED or el in self._evaluating: # value is not known yet
+            return True
+        return self.valueHasChildren(el.value)
+    def valueHasChildren(self,val):
+        if isinstance(val,self.do_not_expand_types) or isinstance(val,Placeholder):
             return False
         else:
             return True
+    @cached_display
     def data(self,index, role):
         col = index.column()
         row = index.row()
         # print("data", row, col)
+        if self.lazy_attributes and col in (1,2) and role in (QtCore.Qt.DisplayRole,QtCore.Qt.ToolTipRole):
+            self._resolveValue(self.elementFromIndex(index))
         if role==QtCore.Qt.DisplayRole:
             # print("data",row,col)
             if col==0:
-                return index.internalPointer().name
+                return self.elementFromIndex(index).name
             elif col==1:
-                return type(index.internalPointer().value).__name__
+                val = self.elementFromIndex(index).value
+                return "" if isinstance(val,Placeholder) else type(val).__name__
             elif col==2:
                 try:
-                    val = index.internalPointer().value
+                    val = self.elementFromIndex(index).value
                     if val is None:
                         return "None"
+                    elif isinstance(val,Placeholder):
+                        return str(val)
                     elif type(val)==type:
                         return val.__name__
                     elif isinstance(val,(Number,str,bytes)): #builting simple types
@@ -406,43 +1928,742 @@ class PythonObjectTreeModel(PythonTreeModelBase):
                 return row,col
         elif role==QtCore.Qt.ToolTipRole:
             if col==2:
-                val = index.internalPointer().value
+                val = self.elementFromIndex(index).value
                 if isinstance(val,(str,bytes)):
                     return str(val)
         # , parent(), rowCount(), columnCount(), and data().Th
     def toggleTypeVisibility(self,hidetypes):
-        self.beginResetModel()
         self.hidetypes = hidetypes
-        self._init_data()
-        self.endResetModel()
+        self._type_attrs.clear()
+        self.refresh()
     def toggleExcludePattern(self,exclude_patterns):
-        self.beginResetModel()
         self.exclude_patterns = exclude_patterns
         self._createExcludePattern()
-        self._init_data()
-        self.endResetModel()
+        self.refresh()
+
+import zipfile,tarfile,tempfile,shutil,datetime,time,io,os,json,ast,abc,struct
+
+class ZipDirectory(object):
+    """
+    directory of archive, dirs are subdirectories by name, members are numbers of files in the member list,
+    size is total size of files in it and in subdirectories (see ArchiveIndex.updateSizes),
+    info is ZipInfo of the directory, if archive has entry for it, archive is ArchiveIndex it belongs to
+    """
+    __slots__ = ["path","dirs","members","files_size","size","info","archive"]
+    def __init__(self,path,archive = None):
+        self.path = path
+        self.archive = archive
+        self.dirs = {}
+        self.members = array("q")
+        self.files_size = 0
+        self.size = 0
+        self.info = None
+    def __len__(self):
+        return len(self.dirs) + len(self.members)
+
+class ArchiveIndex(object):
+    """
+    directory tree of archive members built in one pass over the member list,
+    directories are kept by full path ("" is the root), so directories with equal names do not collide,
+    files are kept as numbers in the member list, their names are taken when directory is listed,
+    members are ZipInfo or other objects with filename and file_size (see ArchiveBackend)
+    """
+    def __init__(self,infos = (),backend = None):
+        self.backend = backend
+        self.infos = []
+        self.root = ZipDirectory("",self)
+        self.dirs = {"": self.root}
+        self.add(infos)
+        self.updateSizes()
+    def _dir(self,path):
+        d = self.dirs.get(path)
+        if d is None:
+            parent,_,name = path.rpartition("/")
+            d = self.dirs[path] = ZipDirectory(path,self)
+            self._dir(parent).dirs[name] = d
+        return d
+    @staticmethod
+    def _normName(name):
+        return name.replace("\\","/").strip("/")
+    def add(self,infos):
+        """
+        adds members (ZipInfo), updateSizes should be called after that
+        """
+        dirs = self.dirs
+        start = len(self.infos)
+        self.infos.extend(infos)
+        last, d = None, None
+        for i in range(start,len(self.infos)):
+            zi = self.infos[i]
+            name = zi.filename
+            if not name or "\\" in name or name[-1] == "/" or name[0] == "/": # rare, names are normalized
+                is_dir = name[-1:] in ("/","\\")
+                name = self._normName(name)
+                if not name:
+                    continue
+                if is_dir:
+                    self._dir(name).info = zi
+                    continue
+            p = name.rfind("/")
+            parent = name[:p] if p > 0 else ""
+            if parent != last: # members of a directory are usually stored together
+                last = parent
+                d = dirs.get(parent)
+                if d is None:
+                    d = self._dir(parent)
+            d.members.append(i)
+            d.files_size += zi.file_size
+    def updateSizes(self):
+        """
+        computes sizes of all directories bottom-up, deeper directories first
+        """
+        for d in self.dirs.values():
+            d.size = d.files_size
+        for path in sorted(self.dirs,key=lambda p: p.count("/"),reverse=True):
+            if path:
+                self.dirs[path.rpartition("/")[0]].size += self.dirs[path].size
+    def items(self,directory):
+        """
+        yields (name, ZipDirectory or ZipInfo) of the directory, subdirectories first
+        """
+        yield from directory.dirs.items()
+        yield from self.members(directory)
+    def members(self,directory,start = 0):
+        """
+        yields (name, ZipInfo) of files in the directory starting from start-th
+        """
+        for i in directory.members[start:]:
+            zi = self.infos[i]
+            yield self._normName(zi.filename).rpartition("/")[2], zi
+
+class _ReportingList(list):
+    """
+    member list filled while archive is scanned, appended items are passed to callback in batches,
+    first batch is small so the first rows are shown as soon as possible
+    """
+    def __init__(self,callback,batch_size,first_batch):
+        super().__init__()
+        self.callback = callback
+        self.batch_size = batch_size
+        self._sent = 0
+        self._next = first_batch
+    def append(self,item):
+        list.append(self,item)
+        if len(self) >= self._next:
+            self.flush()
+    def flush(self):
+        if len(self) > self._sent:
+            self.callback(self[self._sent:])
+            self._sent = len(self)
+        self._next = self._sent + self.batch_size
+
+_ZIP_EOCD = struct.Struct("<4s4H2LH") # end of central directory record
+_ZIP64_LOCATOR = struct.Struct("<4sLQL")
+_ZIP64_EOCD = struct.Struct("<4sQ2H2L4Q")
+_ZIP_CENTRAL_HEADER = struct.Struct("<4s4B4HL2L5H2L")
+
+def _readCentralDirectory(fp):
+    """
+    yields ZipInfo of members while central directory of zip file fp is parsed,
+    records are read one by one according to the zip format (APPNOTE.TXT), so the first members are known at once,
+    ZipInfo objects can be passed to ZipFile.open of the same file
+    """
+    fp.seek(0,io.SEEK_END)
+    size = fp.tell()
+    tail_size = min(size,_ZIP_EOCD.size + 0xFFFF) # the record is followed by comment up to 64 kB
+    fp.seek(size - tail_size)
+    tail = fp.read(tail_size)
+    pos = tail.rfind(b"PK\x05\x06")
+    if pos < 0 or len(tail) - pos < _ZIP_EOCD.size:
+        raise zipfile.BadZipFile("File is not a zip file")
+    eocd_pos = size - tail_size + pos
+    _, _, _, _, count, cd_size, cd_offset, _ = _ZIP_EOCD.unpack_from(tail,pos)
+    start = eocd_pos - cd_size - cd_offset # data prepended to the archive, e.g. self-extracting archives
+    if eocd_pos >= _ZIP64_LOCATOR.size:
+        fp.seek(eocd_pos - _ZIP64_LOCATOR.size)
+        locator = _ZIP64_LOCATOR.unpack(fp.read(_ZIP64_LOCATOR.size))
+        if locator[0] == b"PK\x06\x07":
+            fp.seek(locator[2])
+            record = _ZIP64_EOCD.unpack(fp.read(_ZIP64_EOCD.size))
+            if record[0] != b"PK\x06\x06":
+                raise zipfile.BadZipFile("Corrupt zip64 end of central directory record")
+            count, cd_size, cd_offset = record[7], record[8], record[9]
+            start = eocd_pos - _ZIP64_LOCATOR.size - _ZIP64_EOCD.size - cd_size - cd_offset
+    fp.seek(start + cd_offset)
+    for _ in range(count):
+        header = fp.read(_ZIP_CENTRAL_HEADER.size)
+        if len(header) != _ZIP_CENTRAL_HEADER.size:
+            raise zipfile.BadZipFile("Truncated central directory")
+        (sig, create_version, create_system, extract_version, reserved, flag_bits, compress_type, t, d, crc,
+         compress_size, file_size, n_name, n_extra, n_comment, volume, internal_attr, external_attr,
+         header_offset) = _ZIP_CENTRAL_HEADER.unpack(header)
+        if sig != b"PK\x01\x02":
+            raise zipfile.BadZipFile("Bad magic number for central directory")
+        name = fp.read(n_name)
+        extra = fp.read(n_extra)
+        comment = fp.read(n_comment)
+        name = name.decode("utf-8" if flag_bits & 0x800 else "cp437")
+        info = zipfile.ZipInfo(name,((d>>9)+1980,(d>>5)&0xF,d&0x1F,t>>11,(t>>5)&0x3F,(t&0x1F)*2))
+        info.orig_filename = name
+        info.create_version, info.create_system = create_version, create_system
+        info.extract_version, info.reserved = extract_version, reserved
+        info.flag_bits, info.compress_type, info.CRC = flag_bits, compress_type, crc
+        info.volume, info.internal_attr, info.external_attr = volume, internal_attr, external_attr
+        info.extra, info.comment = extra, comment
+        # zip64 extended information replaces fields set to 0xFFFFFFFF, in this order
+        fields = [v for v in (file_size,compress_size,header_offset) if v == 0xFFFFFFFF]
+        i = 0
+        while fields and i + 4 <= len(extra):
+            tag, n = struct.unpack_from("<2H",extra,i)
+            if tag == 1:
+                values = list(struct.unpack_from("<{}Q".format(min(n//8,len(fields))),extra,i+4))
+                if file_size == 0xFFFFFFFF and values:
+                    file_size = values.pop(0)
+                if compress_size == 0xFFFFFFFF and values:
+                    compress_size = values.pop(0)
+                if header_offset == 0xFFFFFFFF and values:
+                    header_offset = values.pop(0)
+                break
+            i += 4 + n
+        info.file_size, info.compress_size = file_size, compress_size
+        info.header_offset = header_offset + start
+        yield info
+
+class _MemberWindow(io.RawIOBase):
+    """
+    read-only seekable view of a part of file, used for archive members stored without compression,
+    file is shared, so it is positioned before every read under lock
+    """
+    def __init__(self,fileobj,start,size,lock):
+        super().__init__()
+        self.fileobj = fileobj
+        self.start = start
+        self.size = size
+        self.lock = lock
+        self.pos = 0
+    def readable(self):
+        return True
+    def seekable(self):
+        return True
+    def tell(self):
+        return self.pos
+    def seek(self,offset,whence = io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.pos = max(offset,0)
+        return self.pos
+    def readinto(self,b):
+        n = min(len(b),self.size-self.pos)
+        if n <= 0:
+            return 0
+        with self.lock:
+            self.fileobj.seek(self.start+self.pos)
+            data = self.fileobj.read(n)
+        b[:len(data)] = data
+        self.pos += len(data)
+        return len(data)
+
+class ArchiveBackend(abc.ABC):
+    """
+    access to archive of some format, backends are chosen by file name (see ARCHIVE_BACKENDS),
+    members have filename, file_size, date_time and is_dir() like ZipInfo
+    """
+    suffixes = ()
+    def __init__(self,archive):
+        self.archive = archive
+        self.source = None # file object the archive was opened from, it is closed with the archive
+    @classmethod
+    def accepts(cls,name):
+        return name.lower().endswith(cls.suffixes)
+    @classmethod
+    @abc.abstractmethod
+    def open(cls,file,callback = None,batch_size = 5000):
+        """
+        opens archive from file name or seekable file object
+        :param callback: if given, it receives lists of members while archive is indexed
+        """
+    @abc.abstractmethod
+    def members(self):
+        pass
+    @abc.abstractmethod
+    def getinfo(self,name):
+        pass
+    @abc.abstractmethod
+    def openMember(self,info):
+        """
+        returns file object streaming the member
+        """
+    def close(self):
+        self.archive.close()
+        if self.source is not None:
+            self.source.close()
+    def isSeekable(self,info):
+        """
+        True if stream returned by openMember can be seeked without reading the member from the start
+        """
+        return False
+    def openSeekable(self,info,buffer_size = 1<<26):
+        """
+        returns seekable file object with the member (e.g. to open nested archive),
+        members which can not be seeked cheaply are copied to a buffer,
+        which is kept in memory up to buffer_size bytes and spilled to a temporary file above it
+        """
+        if self.isSeekable(info):
+            return self.openMember(info)
+        buf = tempfile.SpooledTemporaryFile(max_size=buffer_size)
+        with self.openMember(info) as f:
+            shutil.copyfileobj(f,buf)
+        buf.seek(0)
+        return buf
+
+class ZipBackend(ArchiveBackend):
+    """
+    zip archive, with callback members are reported while central directory records are parsed
+    (see _readCentralDirectory), ZipFile used to read members is opened after that
+    """
+    suffixes = (".zip",".jar",".whl",".npz")
+    def __init__(self,archive):
+        super().__init__(archive)
+        self._raw = None # file for reading stored members directly
+        self._lock = threading.RLock()
+    @classmethod
+    def open(cls,file,callback = None,batch_size = 5000):
+        if callback is not None:
+            members = _ReportingList(callback,batch_size,100)
+            fp = file if hasattr(file,"read") else open(file,"rb")
+            try:
+                for info in _readCentralDirectory(fp):
+                    members.append(info)
+            finally:
+                if fp is not file:
+                    fp.close()
+            members.flush()
+        return cls(zipfile.ZipFile(file))
+    def members(self):
+        return self.archive.infolist()
+    def getinfo(self,name):
+        return self.archive.getinfo(name)
+    def openMember(self,info):
+        return self.archive.open(info)
+    def isSeekable(self,info):
+        return info.compress_type == zipfile.ZIP_STORED and not info.flag_bits & 1 # not encrypted
+    def openSeekable(self,info,buffer_size = 1<<26):
+        """
+        stored members are read directly from the archive file (ZipExtFile reads from the start on backward seek)
+        """
+        if not self.isSeekable(info):
+            return super().openSeekable(info,buffer_size)
+        with self._lock:
+            if self._raw is None:
+                name = self.archive.filename
+                self._raw = open(name,"rb") if isinstance(name,str) and os.path.isfile(name) else self.archive.fp
+            self._raw.seek(info.header_offset)
+            header = self._raw.read(zipfile.sizeFileHeader)
+        start = info.header_offset + zipfile.sizeFileHeader \
+                + int.from_bytes(header[26:28],"little") + int.from_bytes(header[28:30],"little") # name and extra
+        return io.BufferedReader(_MemberWindow(self._raw,start,info.file_size,self._lock))
+    def close(self):
+        """
+        closes archive and the file opened for stored members
+        """
+        with self._lock:
+            if self._raw is not None and self._raw is not self.archive.fp:
+                self._raw.close()
+            self._raw = None
+        super().close()
+
+class TarMember(object):
+    """
+    member of tar archive with attributes of ZipInfo used by ArchiveIndex and the model
+    """
+    __slots__ = ["tarinfo","filename","file_size","date_time"]
+    def __init__(self,tarinfo):
+        self.tarinfo = tarinfo
+        name = tarinfo.name
+        while name.startswith("./"):
+            name = name[2:]
+        if name == ".":
+            name = ""
+        self.filename = name + "/" if tarinfo.isdir() and name else name
+        self.file_size = tarinfo.size
+        self.date_time = time.localtime(tarinfo.mtime)[:6]
+    def is_dir(self):
+        return self.tarinfo.isdir()
+
+class TarBackend(ArchiveBackend):
+    """
+    tar archive, members are listed once when archive is opened (tar has no central directory),
+    member lookup by name uses a dictionary instead of linear search of TarFile.getmember,
+    members of compressed tar are buffered when opened as nested archives
+    """
+    suffixes = (".tar",".tar.gz",".tgz",".tar.bz2",".tbz2",".tar.xz",".txz")
+    def __init__(self,archive,members = None):
+        super().__init__(archive)
+        self.compressed = type(archive.fileobj).__module__ in ("gzip","bz2","lzma")
+        self._members = members
+        self._by_name = None
+    @classmethod
+    def open(cls,file,callback = None,batch_size = 5000):
+        if hasattr(file,"read"):
+            tar = tarfile.open(fileobj=file,mode="r:*")
+        else:
+            tar = tarfile.open(file,mode="r:*")
+        members = _ReportingList(callback,batch_size,100) if callback else []
+        for ti in tar:
+            members.append(TarMember(ti))
+        if callback:
+            members.flush()
+        return cls(tar,list(members))
+    def members(self):
+        if self._members is None:
+            self._members = [TarMember(ti) for ti in self.archive.getmembers()]
+        return self._members
+    def getinfo(self,name):
+        if self._by_name is None:
+            self._by_name = {m.filename: m for m in self.members()}
+        return self._by_name[name]
+    def openMember(self,info):
+        f = self.archive.extractfile(info.tarinfo)
+        return f if f is not None else io.BytesIO() # directories, devices
+    def isSeekable(self,info):
+        return not self.compressed and info.tarinfo.isreg()
+
+ARCHIVE_BACKENDS = [ZipBackend,TarBackend] # checked in order, the first one accepting file name is used
 
-from pathlib import Path
-import zipfile,datetime
 class PythonZipFileTreeModel(PythonTreeModelBase):
+    PreviewRole = QtCore.Qt.UserRole + 1 # data() returns text preview of file members (see preview)
+    PREVIEW_CHUNK = 4096
+    sigMembersRead = QtCore.Signal(object, object)
+    sigLoaded = QtCore.Signal(int) # number of members, emitted when background reading is finished
     def __init__(self,obj,show_dir_size = True, col_name = 0, col_size = 1, col_date = 2,
-                 fmt_size = " 5.3g", fmt_date = "%Y.%m.%D %H:%M:%S"):
-        super().__init__(obj)
+                 fmt_size = " 5.3g", fmt_date = "%Y.%m.%D %H:%M:%S", display_cache_size = 0,
+                 background = False, batch_size = 5000, preview_bytes = 4096, preview_lines = None,
+                 preview_encoding = "utf-8", preview_cache_size = 1<<22, model_max_bytes = 1<<26,
+                 backends = None, buffer_size = 1<<26):
+        """
+        :param obj: ZipFile, TarFile, ArchiveBackend, file name or file object
+        :param background: if True (and obj is not opened archive) archive is read in a worker thread,
+            rows are inserted in batches, directory sizes are shown when reading is finished,
+            the first rows are shown as soon as the first members are read
+        :param batch_size: number of members inserted at once in background mode
+        :param preview_bytes: maximal number of bytes of a member read for preview
+        :param preview_lines: maximal number of lines in preview (None - not limited)
+        :param preview_cache_size: total size of cached previews in characters
+        :param model_max_bytes: members up to this size are read into memory by previewModel
+        :param backends: list of ArchiveBackend classes, ARCHIVE_BACKENDS by default,
+            members accepted by a backend are expanded as nested archives
+        :param buffer_size: nested archives which can not be read directly from outer archive are buffered,
+            in memory up to this size, in a temporary file above it
+        archive opened by the model (from file name or file object) is closed by close or when the model is deleted
+        """
+        self.preview_bytes = preview_bytes
+        self.preview_lines = preview_lines
+        self.preview_encoding = preview_encoding
+        self.preview_cache = LRUCache(preview_cache_size,getsizeof=len)
+        self.model_max_bytes = model_max_bytes
+        self.loading = False
+        self.load_error = None
+        self.batch_size = batch_size
+        self._listed = {} # ZipDirectory -> (number of dirs, number of members) shown as rows
+        self._pending_sort = None
+        self.backends = ARCHIVE_BACKENDS if backends is None else backends
+        self.buffer_size = buffer_size
+        self._archives = {} # opened archive or member with nested archive -> ArchiveIndex
+        self.nested_errors = {} # member -> exception raised when nested archive was opened
+        self._owned = [] # backends opened by the model, closed by close or when the model is deleted
+        self._closer = weakref.finalize(self,self._closeBackends,self._owned)
+        self.backend = None
+        if isinstance(obj,ArchiveBackend):
+            self.backend = obj
+        elif isinstance(obj,zipfile.ZipFile):
+            self.backend = ZipBackend(obj)
+        elif isinstance(obj,tarfile.TarFile):
+            self.backend = TarBackend(obj)
+        else:
+            name = obj if isinstance(obj,(str,os.PathLike)) else getattr(obj,"name",None)
+            backend_cls = isinstance(name,(str,os.PathLike)) and self.backendFor(os.fspath(name)) or ZipBackend
+            if background:
+                self.loading = True
+                self.archive_index = ArchiveIndex()
+                source, obj = obj, self.archive_index.root
+            else:
+                self.backend = backend_cls.open(obj)
+                self._owned.append(self.backend)
+        if self.backend is not None:
+            obj = self.backend.archive
+            self.archive_index = self._archives[obj] = ArchiveIndex(self.backend.members(),self.backend)
+        self.zipfile = obj if self.backend is not None else None # opened archive (ZipFile or TarFile)
+        super().__init__(obj, display_cache_size=display_cache_size)
         self.fmt_size = fmt_size
         self.fmt_date = fmt_date
         self.show_dir_size = show_dir_size
         self.col_name = col_name
         self.col_size = col_size
         self.col_date = col_date
-        self._szcache = {}
+        if self.loading:
+            self.sigMembersRead.connect(self._onMembersRead, QtCore.Qt.QueuedConnection)
+            self._loader = threading.Thread(target=self._readArchive,args=(source,backend_cls),daemon=True)
+            self._loader.start()
+    def close(self):
+        """
+        closes archive if it was opened by the model and nested archives
+        """
+        self._closeBackends(self._owned)
+    @staticmethod
+    def _closeBackends(backends):
+        for backend in reversed(backends): # nested archives first
+            backend.close()
+        backends.clear()
+    def backendFor(self,name):
+        """
+        returns ArchiveBackend class for the file name or None
+        """
+        for backend in self.backends:
+            if backend.accepts(name):
+                return backend
+    def _readArchive(self,source,backend_cls):
+        """
+        runs in worker thread, members are sent to GUI thread in batches, finally backend (or exception) is sent
+        """
+        try:
+            backend = backend_cls.open(source,lambda batch: self.sigMembersRead.emit(batch,None),self.batch_size)
+        except Exception as e:
+            self.sigMembersRead.emit([],e)
+        else:
+            self.sigMembersRead.emit([],backend)
+    def _onMembersRead(self,batch,result):
+        if batch:
+            self.archive_index.add(batch)
+            self._syncElement(self.el0,QtCore.QModelIndex())
+        if result is None:
+            return
+        if isinstance(result,Exception):
+            self.load_error = result
+        else:
+            self.backend = self.archive_index.backend = result
+            self.zipfile = result.archive
+            self._owned.append(result)
+        self.archive_index.updateSizes()
+        self.loading = False
+        if self.display_cache is not None:
+            self.display_cache.clear()
+        if self.show_dir_size:
+            self._emitSizesChanged(self.el0,QtCore.QModelIndex())
+        if self._pending_sort is not None:
+            self.sort(*self._pending_sort)
+            self._pending_sort = None
+        self.sigLoaded.emit(len(self.archive_index.infos))
+    def _syncElement(self,el,index):
+        """
+        adds rows for members read after the directory was listed,
+        new subdirectories are inserted after shown ones, files are appended, loaded subdirectories are synced too
+        """
+        if not el.loaded:
+            return
+        d = el.value
+        n_dirs, n_members = self._listed[d]
+        if len(d.dirs) > n_dirs:
+            new = list(d.dirs.items())[n_dirs:]
+            self.beginInsertRows(index,n_dirs,n_dirs+len(new)-1)
+            el.children[n_dirs:n_dirs] = [TreeElement(v, name=k, parent=el) for k,v in new]
+            for i in range(n_dirs,len(el.children)):
+                el.children[i].index = i
+            self.endInsertRows()
+            if self.display_cache is not None: # rows of files are shifted
+                self.display_cache.clear()
+        if len(d.members) > n_members:
+            first = len(el.children)
+            self.beginInsertRows(index,first,first+len(d.members)-n_members-1)
+            el.children.extend(TreeElement(v, name=k, parent=el, index=i)
+                               for i,(k,v) in enumerate(d.archive.members(d,n_members),first))
+            self.endInsertRows()
+        self._listed[d] = (len(d.dirs),len(d.members))
+        for row in range(len(d.dirs)): # subdirectories are shown first
+            child = el.children[row]
+            if child.loaded:
+                self._syncElement(child,self.index(row,0,index))
+    def _emitSizesChanged(self,el,index):
+        """
+        emits dataChanged for size column of directories in loaded levels
+        """
+        n_dirs = len(el.value.dirs)
+        if not el.loaded or not n_dirs:
+            return
+        self.dataChanged.emit(self.index(0,self.col_size,index),self.index(n_dirs-1,self.col_size,index))
+        for row in range(n_dirs):
+            self._emitSizesChanged(el.children[row],self.index(row,0,index))
+    def valueHasChildren(self,val):
+        return isinstance(val,ZipDirectory) or val is self.el0.value
+    def childItems(self,val):
+        if isinstance(val,ZipDirectory):
+            yield from val.archive.items(val)
+        elif val is self.el0.value: # opened archive
+            yield from self.archive_index.items(self.archive_index.root)
+    def archiveOf(self,el):
+        """
+        returns ArchiveIndex of the archive (outer or nested) containing member of element el
+        """
+        par = el.parent
+        if isinstance(par.value,ZipDirectory):
+            return par.value.archive
+        return self._archives[par.value]
+    def _openNested(self,el):
+        """
+        opens archive stored as a member of another archive and indexes it,
+        member is read directly from outer archive if possible, otherwise it is buffered (see buffer_size)
+        """
+        info = el.value
+        outer = self.archiveOf(el).backend
+        f = outer.openSeekable(info,self.buffer_size)
+        try:
+            backend = self.backendFor(info.filename).open(f)
+        except Exception:
+            f.close()
+            raise
+        backend.source = f
+        self._owned.append(backend)
+        index = self._archives[info] = ArchiveIndex(backend.members(),backend)
+        return index
+    def _memberInfo(self,member,archive):
+        if isinstance(member,str):
+            return archive.backend.getinfo(member)
+        return member
+    def preview(self,member,max_bytes = None,max_lines = None,archive = None):
+        """
+        returns text with the beginning of the member, only the shown part is read and decompressed,
+        binary members are shown as hex dump, results are kept in preview_cache,
+        None is returned while archive is read in background, text of error if member can not be read
+        :param member: ZipInfo (or other member) or name of the member
+        :param max_bytes: number of bytes to read, preview_bytes by default
+        :param max_lines: number of lines to show, preview_lines by default
+        :param archive: ArchiveIndex of nested archive containing the member (see archiveOf), outer archive by default
+        """
+        archive = archive or self.archive_index
+        if archive.backend is None:
+            return None
+        info = self._memberInfo(member,archive)
+        if info.is_dir():
+            return None
+        max_bytes = max_bytes or self.preview_bytes
+        max_lines = max_lines or self.preview_lines
+        key = (id(info),info.filename,max_bytes,max_lines)
+        text = self.preview_cache.get(key)
+        if text is None:
+            try:
+                data = self._readHead(archive.backend,info,max_bytes,max_lines)
+            except Exception as e: # encrypted, corrupted or truncated member, error is not cached
+                return "error: {}".format(e)
+            text = self._decodePreview(data,max_lines)
+            if len(data) < info.file_size:
+                text += "\n..."
+            self.preview_cache.put(key,text)
+        return text
+    def _readHead(self,backend,info,max_bytes,max_lines = None):
+        """
+        reads up to max_bytes from the beginning of the member, stops earlier when max_lines are read
+        """
+        chunks, n, lines = [], 0, 0
+        with backend.openMember(info) as f:
+            while n < max_bytes:
+                chunk = f.read(min(self.PREVIEW_CHUNK,max_bytes-n))
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                n += len(chunk)
+                if max_lines:
+                    lines += chunk.count(b"\n")
+                    if lines >= max_lines:
+                        break
+        return b"".join(chunks)
+    def _decodePreview(self,data,max_lines):
+        if b"\0" in data[:1024]: # binary
+            return "\n".join(data[i:i+16].hex(" ") for i in range(0,len(data),16))
+        text = data.decode(self.preview_encoding,errors="replace")
+        if max_lines:
+            text = "\n".join(text.split("\n")[:max_lines])
+        return text
+    def previewModel(self,member,archive = None,**kwargs):
+        """
+        returns model showing content of .npy, .json or .h5/.hdf5 member, None for other members,
+        members up to model_max_bytes are read into memory buffer,
+        larger .npy members are truncated to leading rows fitting into model_max_bytes,
+        larger .h5 members are read from the archive on demand (stored members) or buffered (see buffer_size)
+        :param archive: ArchiveIndex of nested archive containing the member, outer archive by default
+        :param kwargs: passed to the model
+        """
+        archive = archive or self.archive_index
+        if archive.backend is None:
+            return None
+        backend = archive.backend
+        info = self._memberInfo(member,archive)
+        ext = info.filename.rpartition(".")[2].lower()
+        if ext == "npy":
+            return PythonArrayTreeModel(self._readNpy(backend,info),**kwargs)
+        elif ext == "json":
+            if info.file_size > self.model_max_bytes:
+                raise ValueError(f"{info.filename} is larger than {self.model_max_bytes} bytes")
+            with backend.openMember(info) as f:
+                return PythonCollectionTreeModel(json.load(f),**kwargs)
+        elif ext in ("h5","hdf5"):
+            import h5py
+            from py2qt_models_hdf import PythonHDFFileTreeModel
+            if info.file_size <= self.model_max_bytes:
+                with backend.openMember(info) as f:
+                    buf = io.BytesIO(f.read())
+            else:
+                buf = backend.openSeekable(info,self.buffer_size)
+            return PythonHDFFileTreeModel(h5py.File(buf,"r"),**kwargs)
+    def _readNpy(self,backend,info):
+        """
+        reads .npy member, if it is larger than model_max_bytes only leading rows are read
+        """
+        fmt = numpy.lib.format
+        with backend.openMember(info) as f:
+            version = fmt.read_magic(f)
+            if version == (1,0):
+                shape, fortran_order, dtype = fmt.read_array_header_1_0(f)
+            elif version == (2,0):
+                shape, fortran_order, dtype = fmt.read_array_header_2_0(f)
+            elif version == (3,0): # header of 2.0 in utf-8
+                header = ast.literal_eval(f.read(int.from_bytes(f.read(4),"little")).decode("utf-8"))
+                shape, fortran_order = header["shape"], header["fortran_order"]
+                dtype = fmt.descr_to_dtype(header["descr"])
+            else:
+                raise ValueError(f"{info.filename}: unsupported .npy version {version}")
+            if dtype.hasobject:
+                raise ValueError(f"{info.filename}: arrays of objects are not supported")
+            row_size = dtype.itemsize
+            for n in shape[1:]:
+                row_size *= n
+            rows = shape[0] if shape else 1
+            if rows*row_size > self.model_max_bytes:
+                if fortran_order:
+                    raise ValueError(f"{info.filename}: large fortran ordered arrays are not supported")
+                rows = max(self.model_max_bytes // max(row_size,1),1)
+                shape = (rows,)+shape[1:]
+            arr = numpy.frombuffer(f.read(rows*row_size),dtype)
+        if fortran_order:
+            return arr.reshape(shape[::-1]).transpose()
+        return arr.reshape(shape)
+    def sort(self,column,order = QtCore.Qt.AscendingOrder):
+        """
+        while archive is read in background sorting is postponed until reading is finished
+        """
+        if self.loading:
+            self._pending_sort = (column,order) if column >= 0 else None
+            return
+        super().sort(column,order)
     def columnCount(self, parent=None, *args, **kwargs):
         return 3
+    @cached_display
     def data(self,index, role):
         col = index.column()
         row = index.row()
         if role in (QtCore.Qt.DisplayRole,QtCore.Qt.ToolTipRole):
-            obj = index.internalPointer()
-            if isinstance(obj.value,zipfile.ZipInfo):
+            obj = self.elementFromIndex(index)
+            if not isinstance(obj.value,ZipDirectory): # member of the archive
                 if col==self.col_name:
                     return self.formatValue(obj.name)
                 elif col==self.col_size:
@@ -451,14 +2672,20 @@ class PythonZipFileTreeModel(PythonTreeModelBase):
                     return datetime.datetime(*obj.value.date_time).strftime(self.fmt_date)
                 else:
                     return row,col
-            elif isinstance(obj.value,dict):
-                if col==0:
+            elif isinstance(obj.value,ZipDirectory):
+                if col==self.col_name:
                     return self.formatValue(obj.name+"/")
-                elif col==1 and self.show_dir_size:
-                    return self.formatSize(self._calcDirSize(obj.name,obj.value))
+                elif col==self.col_size and self.show_dir_size and not self.loading:
+                    return self.formatSize(obj.value.size)
+                elif col==self.col_date and obj.value.info is not None:
+                    return datetime.datetime(*obj.value.info.date_time).strftime(self.fmt_date)
+        elif role == self.PreviewRole:
+            el = self.elementFromIndex(index)
+            if not isinstance(el.value,ZipDirectory):
+                return self.preview(el.value,archive=self.archiveOf(el))
         # elif role==QtCore.Qt.ToolTipRole:
         #     if col==self.col_data:
-        #         val = index.internalPointer().value
+        #         val = self.elementFromIndex(index).value
         #         if isinstance(val,(str,bytes)):
         #             return str(val)
     def headerData(self,section,orient,role):
@@ -470,14 +2697,14 @@ class PythonZipFileTreeModel(PythonTreeModelBase):
             elif section == 2:
                 return 'mdate'
     def hasChildren(self, parent=None, *args, **kwargs):
-        if parent.isValid():
-            el = parent.internalPointer()
-        else:
-            el = self.el0
-        if isinstance(el.value, (zipfile.ZipFile,dict)) or ((isinstance(el.value,zipfile.ZipInfo) and el.value.is_dir())):
+        if not parent.isValid(): # rows of the root may be still read in background
+            return self.rowCount(parent) > 0
+        el = self.elementFromIndex(parent)
+        if el is self.el0 or isinstance(el.value,ZipDirectory) or el.value.is_dir():
             return True
-        else:
-            return False
+        # nested archive, opened when expanded
+        return not self.loading and self.backendFor(el.value.filename) is not None \
+            and el.value not in self.nested_errors
     def formatSize(self,sz):
         if sz==0:
             return "0"
@@ -504,51 +2731,39 @@ class PythonZipFileTreeModel(PythonTreeModelBase):
         elif m == 8:
             u = 'YiB'
         return f"{sz:{self.fmt_size}} {u}"
-    def _createSubPathDict(self, parts, dic, zi):
-        if parts:
-            p,*rest = parts
-
-            if rest:
-                if p not in dic:
-                    dic[p] = OrderedDict()
-                self._createSubPathDict(rest,dic[p],zi)
-            else:
-                dic[p] = zi
-    def _calcDirSize(self,k,dic):
-        if k in self._szcache:
-            return self._szcache[k]
-        else:
-            sz = 0
-            for k,v in dic.items():
-                if isinstance(v,dict):
-                    sz+=self._calcDirSize(k,v)
-                else:
-                    sz+=v.file_size
-            self._szcache[k] = sz
-            return sz
-
-        
+    def sortKey(self,name,val,column):
+        if column == self.col_size:
+            return val.size if isinstance(val,ZipDirectory) else val.file_size
+        elif column == self.col_date:
+            if isinstance(val,ZipDirectory):
+                return val.info.date_time if val.info is not None else ()
+            return val.date_time
+        return self._valueKey(name)
     def createChildren(self,el):
-        obj = el.value        
-        if isinstance(obj,zipfile.ZipFile):
-            paths = OrderedDict()
-            for i, zi in enumerate(obj.infolist()):
-                fn = Path(zi.filename)
-                parts = fn.parts
-                while parts and parts[0]=="\\" or parts[0]=="/":
-                    parts = parts[1:]
-                if len(parts)>1:
-                    self._createSubPathDict(parts,paths,zi)
-                else:
-                    child = TreeElement(zi, name = zi.filename, parent=el, index=i)
-                    el.children.append(child)
-            for j,(p, dic) in enumerate(paths.items()):
-                child = TreeElement(dic, name=p, parent=el, index=j+i)
-                el.children.append(child)
-        elif isinstance(obj,dict):            
-            for i,(k,v) in enumerate(obj.items()):
-                    child = TreeElement(v, name=k, parent=el, index=i)
-                    el.children.append(child)
+        obj = el.value
+        if isinstance(obj,ZipDirectory):
+            pass
+        elif el is self.el0 or obj is self.el0.value: # opened archive, or its copy made by refresh
+            obj = self.archive_index.root
+        else: # member, it has children if it is an archive itself
+            if self.backendFor(obj.filename) is None or obj in self.nested_errors:
+                el.loaded = True
+                return
+            if self.loading: # outer archive is not opened yet
+                return
+            index = self._archives.get(obj) # elements made by refresh share opened nested archive
+            if index is None:
+                try:
+                    index = self._openNested(el)
+                except Exception as e: # corrupted or encrypted member, it is shown without children
+                    self.nested_errors[obj] = e
+                    el.loaded = True
+                    return
+            obj = index.root
+        for i,(k,v) in enumerate(obj.archive.items(obj)):
+            child = TreeElement(v, name=k, parent=el, index=i)
+            el.children.append(child)
+        self._listed[obj] = (len(obj.dirs),len(obj.members))
         el.loaded = True
 
 
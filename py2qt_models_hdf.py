@@ -8,43 +8,371 @@
 #-------------------------------------------------------------------------------
 __author__ = r"Danil Tolmachev (Daniel.Tolmachev@gmail.com/Danil.Tolmachev@tu-dortmund.de)"
 
-from py2qt_models import PythonTreeModelBase, TreeElement, QtCore
+from py2qt_models import PythonTreeModelBase, PythonArrayTreeModel, TreeElement, QtCore, cached_display, LRUCache, \
+    Placeholder
+from collections import deque,OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import threading,json,os,glob,weakref
+import numpy
 import h5py
 
+class HDFEntry(object):
+    """
+    metadata of HDF5 object recorded by HDFMetadataIndex, it is shown in the tree instead of h5py object,
+    so showing the tree does not call HDF5
+    group entry has names of its children
+    """
+    __slots__ = ["name","kind","shape","dtype","chunks","compression","compression_opts","attrs","children","filename"]
+    def __init__(self,name,kind,shape = None,dtype = None,chunks = None,compression = None,
+                 compression_opts = None,attrs = None):
+        self.name = name # full path
+        self.kind = kind # "Group", "Dataset" or "Datatype"
+        self.shape = tuple(shape) if shape is not None else None
+        self.dtype = dtype # string
+        self.chunks = tuple(chunks) if chunks is not None else None
+        self.compression = compression
+        self.compression_opts = compression_opts
+        self.attrs = attrs or {}
+        self.children = [] if kind == "Group" else None
+        self.filename = None # set by catalog, where entries of many files are shown
+    @property
+    def size(self):
+        size = 1
+        for n in self.shape:
+            size *= n
+        return size
+    def toList(self):
+        return [self.name,self.kind,self.shape,self.dtype,self.chunks,self.compression,self.compression_opts,
+                self.attrs]
+
+class HDFMetadataIndex(QtCore.QObject):
+    """
+    paths, types, shapes, dtypes and attributes of all objects in HDF5 group (or file),
+    collected in a background thread group by group, so h5py lock is not held for the whole walk
+    and the file can be used by GUI thread meanwhile
+    index can be saved to a sidecar json file, it is reused while modification time and size of HDF5 file are the same
+    """
+    sigFinished = QtCore.Signal(int) # number of entries
+    def __init__(self,group,sidecar = None,max_attr_len = 200):
+        """
+        :param group: h5py.File or h5py.Group
+        :param sidecar: path of json file to keep the index, True to use "<file>.index.json"
+        :param max_attr_len: attribute values are kept as strings of at most this length
+        """
+        super().__init__()
+        self.group = group
+        self.filename = group.file.filename
+        self.sidecar = self.filename + ".index.json" if sidecar is True else sidecar
+        self.max_attr_len = max_attr_len
+        self.root = group.name
+        self.entries = {self.root: HDFEntry(self.root,"Group")}
+        self.finished = False
+        self._cancelled = False
+        self._thread = None
+    def __len__(self):
+        return len(self.entries)
+    def start(self):
+        """
+        loads the index from sidecar file, if it is up to date, otherwise starts building it in background
+        """
+        if self.sidecar and self.load(self.sidecar):
+            self.finished = True
+            self.sigFinished.emit(len(self))
+            return
+        self._thread = threading.Thread(target=self._run,daemon=True)
+        self._thread.start()
+    def cancel(self):
+        self._cancelled = True
+    def _fileKey(self):
+        st = os.stat(self.filename)
+        return [st.st_mtime_ns,st.st_size]
+    def _entry(self,path,obj):
+        try:
+            attrs = {k: str(v)[:self.max_attr_len] for k,v in obj.attrs.items()}
+        except Exception: # attribute of unsupported type
+            attrs = {}
+        if isinstance(obj,h5py.Dataset):
+            return HDFEntry(path,"Dataset",obj.shape,str(obj.dtype),obj.chunks,obj.compression,
+                            obj.compression_opts,attrs)
+        elif isinstance(obj,h5py.Group):
+            return HDFEntry(path,"Group",attrs=attrs)
+        return HDFEntry(path,type(obj).__name__,attrs=attrs)
+    @staticmethod
+    def linkEntries(entries):
+        """
+        :param entries: HDFEntry list, the root first, parents before children
+        :return: dict path -> HDFEntry, children names are added to group entries
+        """
+        linked = {entries[0].name: entries[0]}
+        for entry in entries[1:]:
+            parent,_,name = entry.name.rpartition("/")
+            linked[parent or "/"].children.append(name)
+            linked[entry.name] = entry
+        return linked
+    def scan(self):
+        """
+        walks the group in the calling thread, objects are visited once like with visititems
+        (soft and external links are not followed), every object is read by a separate h5py call
+        """
+        entries = [self._entry(self.root,self.group)]
+        seen = {self.group.id}
+        queue = deque([(self.root,self.group)])
+        while queue and not self._cancelled:
+            path, group = queue.popleft()
+            prefix = path.rstrip("/") + "/"
+            for name in list(group.keys()):
+                if self._cancelled:
+                    break
+                if not isinstance(group.get(name,getlink=True),h5py.HardLink):
+                    continue
+                obj = group.get(name)
+                if obj is None or obj.id in seen: # e.g. unresolved link, or object linked twice
+                    continue
+                seen.add(obj.id)
+                entries.append(self._entry(prefix + name,obj))
+                if isinstance(obj,h5py.Group):
+                    queue.append((prefix + name,obj))
+        self.entries = self.linkEntries(entries)
+    def _run(self):
+        self.scan()
+        if self._cancelled:
+            return
+        if self.sidecar:
+            self.save(self.sidecar)
+        self.finished = True
+        self.sigFinished.emit(len(self))
+    def update(self,group):
+        """
+        re-reads members of the group (not recursively), entries of new members are added
+        :return: True if members have changed
+        """
+        entry = self.entries[group.name]
+        names = list(group.keys())
+        if names == entry.children:
+            return False
+        prefix = group.name.rstrip("/") + "/"
+        for k in names:
+            if prefix + k not in self.entries:
+                self.entries[prefix + k] = self._entry(prefix + k,group[k])
+        entry.children = names
+        return True
+    def save(self,filename):
+        """
+        writes the index to json file, errors are ignored (e.g. directory is read-only)
+        """
+        try:
+            with open(filename,"w") as f:
+                json.dump({"file": self._fileKey(),"root": self.root,
+                           "entries": [e.toList() for e in self.entries.values()]},f,default=str)
+        except (OSError,TypeError,ValueError):
+            pass
+    def load(self,filename):
+        """
+        reads the index from json file
+        :return: False if file does not exist or it was made for other version of HDF5 file
+        """
+        try:
+            with open(filename) as f:
+                data = json.load(f)
+            if data["file"] != self._fileKey() or data["root"] != self.root:
+                return False
+            entries = [HDFEntry(*e) for e in data["entries"]]
+        except (OSError,ValueError,KeyError,TypeError):
+            return False
+        self.entries = self.linkEntries(entries)
+        return True
+    def find(self,text,max_results = 100,attributes = True):
+        """
+        returns paths of entries which path (or attribute name or value) contains text, case insensitive
+        """
+        return self.findEntries(self.entries,text,max_results,attributes)
+    @staticmethod
+    def findEntries(entries,text,max_results = 100,attributes = True):
+        text = text.lower()
+        results = []
+        for path,entry in list(entries.items()):
+            if text in path.lower() or attributes and \
+                    any(text in k.lower() or text in v.lower() for k,v in entry.attrs.items()):
+                results.append(path)
+                if len(results) >= max_results:
+                    break
+        return results
+
 class PythonHDFFileTreeModel(PythonTreeModelBase):
-    def __init__(self,obj,col_type = 1,encoding = None):
-        super().__init__(obj,col_type=col_type,encoding=encoding)
+    def __init__(self,obj,col_type = 1,encoding = None, display_cache_size = 0, inline_size = 1000,
+                 value_cache_size = 256, metadata_index = False, index_sidecar = None):
+        """
+        :param inline_size: datasets with at most this many elements are read and shown as values,
+            larger datasets are described by shape, dtype, chunks and compression without reading
+        :param value_cache_size: number of read small datasets to keep
+        :param metadata_index: if True, HDFMetadataIndex is built in background (see buildMetadataIndex)
+        :param index_sidecar: path of json file to save the index to and reuse it, True for "<file>.index.json"
+        """
+        self.inline_size = inline_size
+        self.value_cache = LRUCache(value_cache_size)
+        self.metadata_index = None
+        self._follow_timer = None
+        self._shapes = {} # name -> shape of followed dataset at last poll
+        super().__init__(obj,col_type=col_type,encoding=encoding,display_cache_size=display_cache_size)
+        if metadata_index:
+            self.buildMetadataIndex(index_sidecar)
         self.col_name = 0
         if self.col_name == self.col_type:
             self.col_name += 1
         while self.col_data in (self.col_type, self.col_name):
             self.col_data += 1
+    @cached_display
     def data(self,index, role):
         col = index.column()
         row = index.row()
         if role in (QtCore.Qt.DisplayRole,QtCore.Qt.ToolTipRole):
 
             if col==self.col_data:
-                val = index.internalPointer().value
-                if isinstance(val,h5py.Dataset):
-                    val = val[()]
+                val = self.elementFromIndex(index).value
+                if isinstance(val,HDFEntry) and val.kind != "Dataset":
+                    if role == QtCore.Qt.ToolTipRole:
+                        return self.attributesInfo(val)
+                    val = val.children or () # shown as list of names
+                elif isinstance(val,(h5py.Dataset,HDFEntry)):
+                    if role == QtCore.Qt.ToolTipRole:
+                        return self.datasetInfo(val)
+                    data = self.datasetValue(val)
+                    if data is None:
+                        return self.datasetInfo(val,short=True)
+                    val = data
                 return self.formatValue(val)
             elif col==self.col_name:
-                return index.internalPointer().name
+                return self.elementFromIndex(index).name
             elif col==self.col_type:
-                val =  index.internalPointer().value
+                val =  self.elementFromIndex(index).value
                 if isinstance(val,h5py.Dataset):
                     return f"{type(val).__name__} ({val.dtype})"
+                elif isinstance(val,HDFEntry):
+                    return f"{val.kind} ({val.dtype})" if val.kind == "Dataset" else val.kind
                 else:
                     return type(val).__name__
             else:
                 return row,col
         elif role==QtCore.Qt.ToolTipRole:
             if col==self.col_data:
-                val = index.internalPointer().value
+                val = self.elementFromIndex(index).value
                 if isinstance(val,(str,bytes)):
                     return str(val)
 
+    def datasetValue(self,ds):
+        """
+        returns data of small dataset (read once and cached), None if dataset is larger than inline_size
+        """
+        if ds.shape is None or ds.size > self.inline_size: # shape is None for empty dataset
+            return None
+        val = self.value_cache.get(ds.name)
+        if val is None:
+            if isinstance(ds,HDFEntry):
+                ds = self.object.file[ds.name]
+            val = ds[()]
+            self.value_cache.put(ds.name,val)
+        return val
+    def attributesInfo(self,entry):
+        return "\n".join("{}: {}".format(k,v) for k,v in entry.attrs.items()) or None
+    def datasetInfo(self,ds,short = False):
+        """
+        describes dataset from its metadata, data is not read (except small datasets in full description)
+        """
+        shape = "x".join(str(n) for n in ds.shape) if ds.shape else ("scalar" if ds.shape == () else "empty")
+        parts = ["{} {}".format(shape,ds.dtype)]
+        if ds.chunks:
+            parts.append("chunks " + "x".join(str(n) for n in ds.chunks))
+        if ds.compression:
+            parts.append(ds.compression if ds.compression_opts is None
+                         else "{}({})".format(ds.compression,ds.compression_opts))
+        if short:
+            return ", ".join(parts)
+        val = self.datasetValue(ds)
+        if val is not None:
+            parts.append(self.formatValue(val))
+        if isinstance(ds,HDFEntry) and ds.attrs:
+            parts.append(self.attributesInfo(ds))
+        return "\n".join(parts)
+    def follow(self,interval = 1000):
+        """
+        starts polling of the loaded part of the tree, e.g. for file which is written in SWMR mode,
+        grown datasets are updated with dataChanged, new members of groups are added with rowsInserted,
+        cost of a poll depends on number of loaded elements, not on size of the file
+        :param interval: polling interval in ms
+        """
+        if self._follow_timer is None:
+            self._follow_timer = QtCore.QTimer(self)
+            self._follow_timer.timeout.connect(self.poll)
+        self._follow_timer.start(interval)
+    def stopFollowing(self):
+        if self._follow_timer is not None:
+            self._follow_timer.stop()
+    def poll(self):
+        """
+        checks shapes of loaded datasets and members of loaded groups (the root too) once
+        """
+        if isinstance(self.el0.value,h5py.Group) and self._membersChanged(self.el0,self.el0.value):
+            self._refreshElement(self.el0,QtCore.QModelIndex())
+        else:
+            self._pollElement(self.el0,QtCore.QModelIndex())
+    def _membersChanged(self,el,group):
+        if self.metadata_index is not None and self.metadata_index.finished \
+                and group.name in self.metadata_index.entries:
+            return self.metadata_index.update(group)
+        return set(group.keys()) != {c.name for c in el.children} # renamed members too
+    def _pollElement(self,el,index):
+        changed = []
+        for row,child in enumerate(el.children):
+            val = child.value
+            obj = self.object.file[val.name] if isinstance(val,HDFEntry) else val
+            if isinstance(obj,h5py.Dataset):
+                name = obj.name
+                old_shape = val.shape if isinstance(val,HDFEntry) else self._shapes.get(name)
+                try:
+                    obj.refresh() # reloads metadata of dataset in SWMR mode
+                except (AttributeError,ValueError,RuntimeError): # not supported by HDF5 or file mode
+                    pass
+                self._shapes[name] = obj.shape
+                if old_shape is not None and obj.shape != old_shape:
+                    if isinstance(val,HDFEntry):
+                        val.shape = obj.shape
+                    self.value_cache.pop(name)
+                    changed.append(row)
+            elif isinstance(obj,h5py.Group) and child.loaded:
+                if self._membersChanged(child,obj): # rows are inserted or removed in place
+                    self._refreshElement(child,self.index(row,0,index))
+                else:
+                    self._pollElement(child,self.index(row,0,index))
+        if changed:
+            if self.display_cache is not None:
+                self.display_cache.clear()
+            self._emitRowsChanged(index,changed)
+    def buildMetadataIndex(self,sidecar = None):
+        """
+        starts building HDFMetadataIndex of the object in background (or loads it from sidecar file),
+        groups expanded after it is finished are populated from the index
+        :return: HDFMetadataIndex, its sigFinished can be used to show progress
+        """
+        if self.metadata_index is not None:
+            self.metadata_index.cancel()
+        self.metadata_index = HDFMetadataIndex(self.object,sidecar=sidecar)
+        self.metadata_index.start()
+        return self.metadata_index
+    def search(self,text,max_results = 100,attributes = True):
+        """
+        searches paths and attributes in metadata index, if it is built, see PythonTreeModelBase.search
+        """
+        if self.metadata_index is None:
+            return super().search(text,max_results)
+        indexes = []
+        root = self.metadata_index.root.rstrip("/")
+        for path in self.metadata_index.find(text,max_results,attributes):
+            if path == self.metadata_index.root:
+                continue
+            index = self.indexForPath(path[len(root)+1:].split("/"))
+            if index.isValid():
+                indexes.append(index)
+        return indexes
     def headerData(self,section,orient,role):
         if orient == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
             if section == self.col_data:
@@ -55,20 +383,25 @@ class PythonHDFFileTreeModel(PythonTreeModelBase):
                 return 'type'
 
     def hasChildren(self, parent=None, *args, **kwargs):
-        if parent.isValid():
-            el = parent.internalPointer()
-        else:
-            el = self.el0
-        if isinstance(el.value, (h5py.Group,h5py.File)):
+        el = self.elementFromIndex(parent)
+        if isinstance(el.value, (h5py.Group,h5py.File)) or isinstance(el.value,HDFEntry) and el.value.kind == "Group":
             return True
         else:
             return False
     def createChildren(self,el):
         obj = el.value
-        if isinstance(obj,(h5py.Group,h5py.File)):
+        index = self.metadata_index
+        if index is not None and index.finished and isinstance(obj,(h5py.Group,HDFEntry)) and obj.name in index.entries:
+            prefix = obj.name.rstrip("/") + "/"
+            for i,k in enumerate(index.entries[obj.name].children or ()):
+                child = TreeElement(index.entries[prefix + k], name=k, parent=el, index=i)
+                el.children.append(child)
+        elif isinstance(obj,(h5py.Group,h5py.File)):
             for i,(k, val) in enumerate(obj.items()):
                 child = TreeElement(val, name=k, parent=el, index=i)
                 el.children.append(child)
+                if isinstance(val,h5py.Dataset): # poll compares with the shape at loading
+                    self._shapes[val.name] = val.shape
         elif hasattr(obj,"__iter__") and not isinstance(obj,(str,bytes,bytearray,dict)):
             for i,val in enumerate(obj):
                 child = TreeElement(val, name="[{}]".format(i), parent=el, index=i)
@@ -78,4 +411,413 @@ class PythonHDFFileTreeModel(PythonTreeModelBase):
         if self.col_type>-1:
             return 3
         else:
-            return 2
\ No newline at end of file
+            return 2
+
+class HDFChunkCache(object):
+    """
+    decoded blocks of 1d or 2d h5py.Dataset, blocks are aligned to chunks of the dataset
+    (several chunks along rows, if chunks are small), cache size is limited in bytes
+    blocks can be prefetched by a worker thread, block which is being read by the worker is not read twice
+    """
+    def __init__(self,ds,max_bytes = 256<<20,block_bytes = 4<<20):
+        """
+        :param max_bytes: maximal size of cached blocks
+        :param block_bytes: chunks are joined along rows to blocks of about this size
+        """
+        self.ds = ds
+        self.shape = (ds.shape[0],ds.shape[1] if ds.ndim > 1 else 1)
+        chunks = ds.chunks or (1,self.shape[1]) # contiguous dataset is read by rows
+        cols = chunks[1] if ds.ndim > 1 else 1
+        row_bytes = max(1,cols*ds.dtype.itemsize)
+        rows = max(chunks[0],block_bytes // row_bytes // chunks[0] * chunks[0])
+        self.block_shape = (rows,cols) # last block is shorter, if dataset is smaller
+        self.cache = LRUCache(max_bytes,getsizeof=lambda block: block.nbytes)
+        self._lock = threading.Condition()
+        self._loading = {} # key -> Event, blocks being read
+        self._queue = deque()
+        self._thread = None
+        self._stopped = False
+        self._generation = 0 # changed by resize, blocks read before it are not cached
+    def blockCount(self):
+        return tuple(-(-n // b) for n,b in zip(self.shape,self.block_shape))
+    def _read(self,key):
+        r0 = key[0]*self.block_shape[0]
+        c0 = key[1]*self.block_shape[1]
+        if self.ds.ndim > 1:
+            return self.ds[r0:r0 + self.block_shape[0],c0:c0 + self.block_shape[1]]
+        return self.ds[r0:r0 + self.block_shape[0]].reshape(-1,1)
+    def block(self,key):
+        """
+        returns block (bi, bj), it is read if it is not cached
+        """
+        while True:
+            with self._lock:
+                block = self.cache.get(key)
+                if block is not None:
+                    return block
+                event = self._loading.get(key)
+                if event is None:
+                    event = self._loading[key] = threading.Event()
+                    generation = self._generation
+                    break
+            event.wait() # block is read by other thread
+        try:
+            block = self._read(key)
+            with self._lock:
+                if generation == self._generation:
+                    self.cache.put(key,block)
+        finally:
+            with self._lock:
+                del self._loading[key]
+            event.set()
+        return block
+    def read(self,r0,r1,c0,c1):
+        """
+        returns 2d array of rows r0:r1 and columns c0:c1, assembled from cached blocks
+        """
+        b0,b1 = self.block_shape
+        rows = []
+        for bi in range(r0 // b0,(r1 - 1) // b0 + 1):
+            parts = []
+            for bj in range(c0 // b1,(c1 - 1) // b1 + 1):
+                block = self.block((bi,bj))
+                parts.append(block[max(r0 - bi*b0,0):r1 - bi*b0,max(c0 - bj*b1,0):c1 - bj*b1])
+            rows.append(parts[0] if len(parts) == 1 else numpy.concatenate(parts,axis=1))
+        return rows[0] if len(rows) == 1 else numpy.concatenate(rows,axis=0)
+    def prefetch(self,keys):
+        """
+        schedules reading of blocks in background, previously scheduled blocks are dropped
+        """
+        n = self.blockCount()
+        with self._lock:
+            if self._stopped:
+                return
+            self._queue.clear()
+            self._queue.extend(k for k in keys if 0 <= k[0] < n[0] and 0 <= k[1] < n[1])
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,daemon=True)
+                self._thread.start()
+            self._lock.notify()
+    def resize(self,rows):
+        """
+        sets new number of rows of grown dataset, the last block, which was cut by the old end, is dropped,
+        blocks which are being read meanwhile are not cached
+        """
+        with self._lock:
+            last = (self.shape[0] - 1) // self.block_shape[0]
+            self.shape = (rows,self.shape[1])
+            self._generation += 1
+            for key in self.cache.keys():
+                if key[0] == last:
+                    self.cache.pop(key)
+    def shutdown(self):
+        with self._lock:
+            self._stopped = True
+            self._queue.clear()
+            self._lock.notify()
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._queue and not self._stopped:
+                    self._lock.wait()
+                if self._stopped:
+                    return
+                key = self._queue.popleft()
+                if key in self.cache or key in self._loading:
+                    continue
+            try:
+                self.block(key)
+            except Exception: # e.g. file is closed, block will be read (and fail) in GUI thread
+                pass
+
+class PythonHDFDatasetModel(PythonArrayTreeModel):
+    """
+    table of values of 1d or 2d h5py.Dataset, only blocks under shown cells are read,
+    blocks are aligned to chunks of the dataset and cached, next blocks in the scrolling direction
+    are read in background
+    rows can not be sorted, it would read the whole column
+    fields of compound datasets are formatted separately and shown together in one cell
+    """
+    def __init__(self,ds,fmt = None,tile_rows = 256,tile_cols = 16,tile_cache_size = 64,
+                 chunk_cache_bytes = 256<<20,prefetch_blocks = 2):
+        """
+        :param chunk_cache_bytes: maximal size of cached decoded blocks
+        :param prefetch_blocks: number of blocks read ahead in scrolling direction, 0 disables prefetching
+        """
+        if ds.shape is None or ds.ndim not in (1,2):
+            raise ValueError("only 1d and 2d datasets can be shown, {} has shape {}".format(ds.name,ds.shape))
+        self.chunk_cache = HDFChunkCache(ds,chunk_cache_bytes)
+        self.prefetch_blocks = prefetch_blocks
+        self._last_tile_row = 0
+        self._follow_timer = None
+        super().__init__(ds,virtual_children=True,fmt=fmt,tile_rows=tile_rows,tile_cols=tile_cols,
+                         tile_cache_size=tile_cache_size)
+    def _initColumns(self,obj):
+        self.columns = None # fields of compound dataset are shown as records
+        self.row_labels = None
+    def _readBlock(self,rows,c0,c1):
+        return self.chunk_cache.read(rows.start,rows.stop,c0,c1)
+    def formatBlock(self,block):
+        if block.dtype.names is None:
+            return super().formatBlock(block)
+        text = None
+        for name in block.dtype.names:
+            values = block[name]
+            if values.ndim > block.ndim: # field with shape
+                field = numpy.array([str(v) for v in values.reshape((-1,) + values.shape[block.ndim:])],
+                                    dtype=str).reshape(block.shape)
+            else:
+                field = self.formatBlock(values) # fmt is applied to numeric fields, nested compounds too
+            text = field if text is None else numpy.char.add(numpy.char.add(text,", "),field)
+        return numpy.char.add(numpy.char.add("(",text),")")
+    def _formatTile(self,tile_row,tile_col):
+        tile = super()._formatTile(tile_row,tile_col)
+        if self.prefetch_blocks:
+            step = -1 if tile_row < self._last_tile_row else 1
+            b0,b1 = self.chunk_cache.block_shape
+            r = (tile_row*self.tile_rows if step < 0 else (tile_row + 1)*self.tile_rows - 1) // b0
+            cols = range(tile_col*self.tile_cols // b1,((tile_col + 1)*self.tile_cols - 1) // b1 + 1)
+            self.chunk_cache.prefetch([(r + step*i,c) for i in range(1,self.prefetch_blocks + 1) for c in cols])
+        self._last_tile_row = tile_row
+        return tile
+    def data(self,index,role):
+        if role in (QtCore.Qt.DisplayRole,QtCore.Qt.ToolTipRole) and self.tile_cache is None:
+            # single cells are taken from cached blocks too
+            block = self.chunk_cache.read(index.row(),index.row() + 1,index.column(),index.column() + 1)
+            return str(self.formatBlock(block)[0,0])
+        return super().data(index,role)
+    def sort(self,column,order = QtCore.Qt.AscendingOrder):
+        pass
+    def follow(self,interval = 1000):
+        """
+        starts polling of the dataset size, e.g. if it is written in SWMR mode, new rows are added with rowsInserted
+        :param interval: polling interval in ms
+        """
+        if self._follow_timer is None:
+            self._follow_timer = QtCore.QTimer(self)
+            self._follow_timer.timeout.connect(self.poll)
+        self._follow_timer.start(interval)
+    def stopFollowing(self):
+        if self._follow_timer is not None:
+            self._follow_timer.stop()
+    def poll(self):
+        """
+        checks number of rows of the dataset once, only its metadata is read
+        """
+        try:
+            self.object.refresh()
+        except (AttributeError,ValueError,RuntimeError):
+            pass
+        old, new = self.chunk_cache.shape[0], len(self.object)
+        if new <= old:
+            return
+        self.chunk_cache.resize(new)
+        if self.tile_cache is not None: # last tiles were cut by the old end of the dataset
+            for key in self.tile_cache.keys():
+                if key[0] == (old - 1) // self.tile_rows:
+                    self.tile_cache.pop(key)
+        self.beginInsertRows(QtCore.QModelIndex(),old,new - 1)
+        self.el0.children.count = new
+        self.endInsertRows()
+    def hasChildren(self, parent=None, *args, **kwargs):
+        return not parent.isValid() # rows are not read to find it out
+    def shutdown(self):
+        """
+        stops prefetching thread, it should be called before the file is closed
+        """
+        self.chunk_cache.shutdown()
+
+def _scanFile(filename):
+    """
+    runs in worker process of PythonHDFCatalogModel
+    :return: metadata of all objects in the file as lists (see HDFEntry.toList)
+    """
+    with h5py.File(filename,"r") as f:
+        index = HDFMetadataIndex(f)
+        index.scan()
+        return [e.toList() for e in index.entries.values()]
+
+class HDFFilePool(object):
+    """
+    open HDF5 files, at most max_open files are kept open, least recently used file is closed first,
+    files with pinned objects (see pin) are not closed, so the pool may be larger while they are used
+    """
+    def __init__(self,max_open = 16):
+        self.max_open = max_open
+        self._files = OrderedDict()
+        self._pins = {} # file name -> number of live pinned objects
+    def get(self,filename):
+        f = self._files.get(filename)
+        if f is not None and f.id.valid:
+            self._files.move_to_end(filename)
+            return f
+        f = self._files[filename] = h5py.File(filename,"r")
+        self._files.move_to_end(filename)
+        self._closeUnused(keep=filename)
+        return f
+    def _closeUnused(self,keep = None):
+        for filename in list(self._files):
+            if len(self._files) <= self.max_open:
+                break
+            if filename != keep and not self._pins.get(filename):
+                self._files.pop(filename).close()
+    def pin(self,obj,filename):
+        """
+        keeps file of h5py object open while the object is alive
+        """
+        self._pins[filename] = self._pins.get(filename,0) + 1
+        weakref.finalize(obj,self._unpin,filename)
+        return obj
+    def _unpin(self,filename):
+        n = self._pins.pop(filename,0) - 1
+        if n > 0:
+            self._pins[filename] = n
+        else:
+            self._closeUnused()
+    def closeAll(self):
+        """
+        closes all files, pinned too
+        """
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+    def __len__(self):
+        return len(self._files)
+
+class PythonHDFCatalogModel(PythonHDFFileTreeModel):
+    """
+    many HDF5 files under one root, metadata of files is read in parallel by a process pool,
+    the tree is built from the metadata, so files are not kept open,
+    they are opened only to read small datasets through HDFFilePool
+    rows of files are shown at once (named by full path), they are filled as soon as scanning of the file is finished
+    """
+    sigFileScanned = QtCore.Signal(str, object) # file name, future
+    def __init__(self,files,col_type = 1,encoding = None,display_cache_size = 0,inline_size = 1000,
+                 value_cache_size = 256,max_open_files = 16,workers = None):
+        """
+        :param files: list of file names or directory, files *.h5, *.hdf5, *.hdf, *.nxs of which are shown
+        :param max_open_files: size of HDFFilePool
+        :param workers: number of scanning processes, number of CPUs by default
+        """
+        if isinstance(files,(str,os.PathLike)):
+            files = sorted(f for ext in ("h5","hdf5","hdf","nxs") for f in glob.glob(os.path.join(files,"*." + ext)))
+        self.files = [os.fspath(f) for f in files]
+        self.catalog = {} # file name -> dict path -> HDFEntry
+        self.scan_errors = {} # file name -> Placeholder with error of scanning
+        self.handles = HDFFilePool(max_open_files)
+        super().__init__(self.files,col_type=col_type,encoding=encoding,display_cache_size=display_cache_size,
+                         inline_size=inline_size,value_cache_size=value_cache_size)
+        self.sigFileScanned.connect(self._onFileScanned, QtCore.Qt.QueuedConnection)
+        self._executor = ProcessPoolExecutor(workers)
+        for filename in self.files:
+            future = self._executor.submit(_scanFile,filename)
+            # callback is called in executor thread, the result is passed to GUI thread by signal
+            future.add_done_callback(lambda future,filename=filename: self.sigFileScanned.emit(filename,future))
+    def _onFileScanned(self,filename,future):
+        try:
+            entries = [HDFEntry(*e) for e in future.result()]
+        except Exception as e:
+            self.scan_errors[filename] = Placeholder("error: {}".format(e))
+        else:
+            for entry in entries:
+                entry.filename = filename
+            self.catalog[filename] = HDFMetadataIndex.linkEntries(entries)
+        # rows may have been sorted since scanning was started, row of the file is found by its name
+        el = next((c for c in self.el0.children if c.name == filename),None)
+        if el is None:
+            return
+        el.value = self._fileValue(filename)
+        row = el.index
+        index = self.index(row,0,QtCore.QModelIndex())
+        if isinstance(el.value,HDFEntry): # placeholder had no children, rows of the root group are inserted
+            tmp = TreeElement(el.value)
+            self.createChildren(tmp)
+            children = list(self._reparent(tmp.children,el))
+            if children and self._sort_column is not None:
+                children = self._sortedElements(children)
+            if children:
+                self.beginInsertRows(index,0,len(children) - 1)
+                el.children = children
+                el.loaded = True
+                self.endInsertRows()
+            else:
+                el.loaded = True
+        if self.display_cache is not None:
+            self.invalidateDisplayCache(index)
+        else:
+            self._emitRowsChanged(QtCore.QModelIndex(),[row])
+    def _fileValue(self,filename):
+        """
+        returns value of the file row: root HDFEntry of scanned file, error or "scanning..." placeholder
+        """
+        entries = self.catalog.get(filename)
+        if entries is not None:
+            return entries["/"]
+        return self.scan_errors.get(filename) or Placeholder("scanning...")
+    def createChildren(self,el):
+        obj = el.value
+        if el is self.el0 or obj is self.el0.value: # root, or its copy made by refresh
+            for i,filename in enumerate(obj):
+                # full path, so files with equal names in different directories can be found by indexForPath
+                el.children.append(TreeElement(self._fileValue(filename), name=filename, parent=el, index=i))
+        elif isinstance(obj,HDFEntry) and obj.kind == "Group":
+            entries = self.catalog[obj.filename]
+            prefix = obj.name.rstrip("/") + "/"
+            for i,k in enumerate(obj.children):
+                el.children.append(TreeElement(entries[prefix + k], name=k, parent=el, index=i))
+        el.loaded = True
+    def hasChildren(self, parent=None, *args, **kwargs):
+        if not parent.isValid():
+            return bool(self.files)
+        return super().hasChildren(parent)
+    def data(self,index,role):
+        val = self.elementFromIndex(index).value
+        if isinstance(val,Placeholder):
+            if role == QtCore.Qt.DisplayRole and index.column() == self.col_data:
+                return str(val)
+            elif role == QtCore.Qt.DisplayRole and index.column() == self.col_name:
+                return self.elementFromIndex(index).name
+            return None
+        return super().data(index,role)
+    def datasetValue(self,ds):
+        if ds.shape is None or ds.size > self.inline_size:
+            return None
+        key = (ds.filename,ds.name)
+        val = self.value_cache.get(key)
+        if val is None:
+            val = self.handles.get(ds.filename)[ds.name][()]
+            self.value_cache.put(key,val)
+        return val
+    def dataset(self,index):
+        """
+        returns h5py.Dataset of the row (e.g. for PythonHDFDatasetModel), its file is taken from HDFFilePool,
+        the file is kept open while the dataset is alive
+        """
+        entry = self.elementFromIndex(index).value
+        return self.handles.pin(self.handles.get(entry.filename)[entry.name],entry.filename)
+    def search(self,text,max_results = 100,attributes = True):
+        """
+        searches paths and attributes in metadata of scanned files
+        """
+        indexes = []
+        for row,filename in enumerate(self.files):
+            entries = self.catalog.get(filename)
+            if entries is None:
+                continue
+            for path in HDFMetadataIndex.findEntries(entries,text,max_results - len(indexes),attributes):
+                if path == "/":
+                    continue
+                index = self.indexForPath([filename] + path[1:].split("/"))
+                if index.isValid():
+                    indexes.append(index)
+            if len(indexes) >= max_results:
+                break
+        return indexes
+    def poll(self):
+        pass # files of catalog are not followed
+    def shutdown(self):
+        """
+        stops scanning processes and closes open files
+        """
+        self._executor.shutdown(wait=False,cancel_futures=True)
+        self.handles.closeAll()
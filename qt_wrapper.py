@@ -34,14 +34,87 @@
         then returned value will be sent back using another signal to main thread
         and then value will be displayed in a label.
     
+    with shared pool of threads
+    
+        devices = [QtWrapper(Voltmeter(port), pool=True) for port in ports]
+        
+        many wrappers can share a bounded pool of worker threads instead of having a thread each,
+        calls to one device are still executed one after another, different devices work in parallel,
+        call QtWrapper.shutdownAll() before exit to stop and join the threads
+    
 """
 __author__ = r"Daniel Tolmachev (Daniel.Tolmachev@gmail.com/Danil.Tolmachev@tu-dortmund.de)"
 
 
-import sys, traceback, logging
+import sys, traceback, logging, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from qtpy import QtCore
 
 log = logging.getLogger(__name__)
+
+class QtWrapperPool(object):
+    """
+    bounded pool of worker threads shared by QtWrapper objects (see pool parameter of QtWrapper),
+    calls of one wrapper are executed one after another in order they were made,
+    calls of different wrappers run in parallel
+    """
+    def __init__(self, max_workers=8, fairness=16):
+        """
+        :param max_workers: number of threads
+        :param fairness: after so many consecutive calls of one wrapper, its other calls are queued behind other wrappers
+        """
+        self.fairness = fairness
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="QtWrapper")
+        self._lock = threading.Lock()
+        self._queues = {}  # wrapper -> deque of (function, args), present while wrapper's calls are scheduled
+        self._closed = False
+
+    def submit(self, wrapper, func, *args):
+        """
+        schedules func(*args) after pending calls of the wrapper
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("QtWrapperPool is shut down")
+            queue = self._queues.get(wrapper)
+            if queue is not None:  # wrapper's calls are already scheduled, they will run this one too
+                queue.append((func, args))
+                return
+            self._queues[wrapper] = deque([(func, args)])
+            self.executor.submit(self._drain, wrapper)
+
+    def _drain(self, wrapper):
+        n = 0
+        while True:
+            with self._lock:
+                queue = self._queues[wrapper]
+                if not queue:
+                    del self._queues[wrapper]
+                    return
+                if n >= self.fairness and not self._closed:
+                    self.executor.submit(self._drain, wrapper)  # let other wrappers run
+                    return
+                func, args = queue.popleft()
+            n += 1
+            try:
+                func(*args)
+            except Exception:
+                log.exception("exception in %s", func)
+
+    def shutdown(self, wait=True, cancel_pending=False):
+        """
+        stops the threads, no calls are accepted after that
+        :param wait: if True, waits until threads are finished (and pending calls are done unless cancelled)
+        :param cancel_pending: if True, calls which have not started yet are dropped
+        """
+        with self._lock:
+            self._closed = True
+            if cancel_pending:
+                for queue in self._queues.values():
+                    queue.clear()
+        self.executor.shutdown(wait)
+
 class QtWrapper(QtCore.QObject):
     """
     
@@ -50,29 +123,84 @@ class QtWrapper(QtCore.QObject):
     sigFunctionReturned = QtCore.Signal(str, object)
     sigExceptionRaised = QtCore.Signal(str, object)
     wrp_threads_static = []
+    wrp_pool_static = None  # shared pool used with pool=True, see defaultPool
+    default_pool_size = 8
     # public methods
     def __init__(self, obj, *, thread=None, moveToNewThread=True, printExcInfo=True,
-                 printReturns=False, verbose=False, skipPrivateMethods=True):
+                 printReturns=False, verbose=False, skipPrivateMethods=True, pool=None):
+        """
+        :param pool: True to run calls in the shared pool of threads (see defaultPool) or QtWrapperPool,
+            thread and moveToNewThread are ignored then, wrapper stays in the caller's thread,
+            dispatchSignals is called in wrapper's thread
+        """
         self.wrp_printExcInfo = printExcInfo
         self.wrp_printReturns = printReturns
         self.wrp_skipPrvateMethods = skipPrivateMethods
         self.object = None
         self.wrp_object2create = None
+        self.wrp_thread = None  # thread created for this wrapper
+        self.wrp_pool = self.defaultPool() if pool is True else pool
         if verbose:
             log.setLevel(logging.DEBUG)
         super(QtWrapper, self).__init__()
-        if isinstance(thread, QtCore.QThread):
+        if self.wrp_pool is not None:
+            pass
+        elif isinstance(thread, QtCore.QThread):
             self.wrp_threads_static.append(thread)
             self.moveToThread(thread)
         elif moveToNewThread:
-            thread = QtCore.QThread()
+            thread = self.wrp_thread = QtCore.QThread()
             self.wrp_threads_static.append(thread)
             thread.start()
             self.moveToThread(thread)
         self.setObject(obj)
-        self.wrp_sigCallRequested.connect(self.wrp_call__wrapped_func_, QtCore.Qt.QueuedConnection)
+        if self.wrp_pool is not None:
+            self.wrp_sigCallRequested.connect(self.wrp_submitCall, QtCore.Qt.DirectConnection)
+        else:
+            self.wrp_sigCallRequested.connect(self.wrp_call__wrapped_func_, QtCore.Qt.QueuedConnection)
         self.sigFunctionReturned.connect(self.dispatchSignals)
 
+    @classmethod
+    def defaultPool(cls):
+        """
+        returns shared QtWrapperPool with default_pool_size threads, it is created on first use
+        """
+        if cls.wrp_pool_static is None:
+            QtWrapper.wrp_pool_static = QtWrapperPool(cls.default_pool_size)
+        return cls.wrp_pool_static
+
+    def shutdown(self, wait=True):
+        """
+        stops the thread created for this wrapper (moveToNewThread), wrapped object is not called after that,
+        threads passed to constructor and pools are not stopped (see shutdownAll and QtWrapperPool.shutdown)
+        :param wait: if True, waits until the thread is finished
+        """
+        thread, self.wrp_thread = self.wrp_thread, None
+        if thread is None:
+            return
+        thread.quit()
+        if wait:
+            thread.wait()
+        if thread in self.wrp_threads_static:
+            self.wrp_threads_static.remove(thread)
+
+    @classmethod
+    def shutdownAll(cls, wait=True):
+        """
+        stops all threads used by wrappers (including threads passed to constructor) and the shared pool
+        :param wait: if True, waits until threads are finished
+        """
+        threads = list(QtWrapper.wrp_threads_static)
+        QtWrapper.wrp_threads_static.clear()
+        for thread in threads:
+            thread.quit()
+        if wait:
+            for thread in threads:
+                thread.wait()
+        pool, QtWrapper.wrp_pool_static = QtWrapper.wrp_pool_static, None
+        if pool is not None:
+            pool.shutdown(wait)
+
     def setObject(self, obj):
         """
         This functions set object that will be Qtfied:
@@ -86,7 +214,10 @@ class QtWrapper(QtCore.QObject):
         # directly inside wrapper, that can be useful if Qtfy object works
         #  in another thread, in that case wrapped object will be instantiated
         # in that thread
-        self.wrp_sigObjectSetRequested.connect(self.wrp_createObject)
+        if self.wrp_pool is not None:
+            self.wrp_sigObjectSetRequested.connect(self.wrp_submitCreate)
+        else:
+            self.wrp_sigObjectSetRequested.connect(self.wrp_createObject)
         if type(obj) == type:  # obj is a type name
             self.wrp_findAttributes(obj)
             self.wrp_object2create = obj
@@ -166,6 +297,18 @@ class QtWrapper(QtCore.QObject):
             self.object = self.wrp_object2create[0](*self.wrp_object2create[1:])
         self.wrp_object2create = None
 
+    def wrp_submitCall(self, sender, func_name, args, kwargs):
+        try:
+            self.wrp_pool.submit(self, self.wrp_call__wrapped_func_, sender, func_name, args, kwargs)
+        except RuntimeError:  # raising in a slot may abort the application
+            log.warning("%s is not called, pool is shut down", func_name)
+
+    def wrp_submitCreate(self):
+        try:
+            self.wrp_pool.submit(self, self.wrp_createObject)
+        except RuntimeError:  # raising in a slot may abort the application
+            log.warning("object is not created, pool is shut down")
+
     def wrp_call__wrapped_func_(self, sender, func_name, args, kwargs):
         try:
             log.debug("calling %s%s %s", func_name, args, kwargs)
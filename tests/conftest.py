@@ -0,0 +1,23 @@
+import os, sys
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from qtpy import QtCore, QtWidgets
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    yield app
+
+
+def wait_for(app, condition, timeout=10.0):
+    """processes events until condition() is true"""
+    timer = QtCore.QElapsedTimer()
+    timer.start()
+    while not condition():
+        if timer.elapsed() > timeout * 1000:
+            return False
+        app.processEvents(QtCore.QEventLoop.AllEvents, 50)
+    return True
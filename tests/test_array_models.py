@@ -0,0 +1,79 @@
+import numpy
+from qtpy import QtCore
+from qtpy.QtTest import QAbstractItemModelTester
+
+from py2qt_models import PythonArrayTreeModel
+
+
+def check(model):
+    return QAbstractItemModelTester(model, QAbstractItemModelTester.FailureReportingMode.Fatal)
+
+
+def vertical_header(model):
+    return [model.headerData(r, QtCore.Qt.Vertical, QtCore.Qt.DisplayRole) for r in range(model.rowCount())]
+
+
+def test_vertical_header_after_sort(qapp):
+    model = PythonArrayTreeModel(numpy.array([[3, 0], [1, 0], [2, 0]]))
+    check(model)
+    assert vertical_header(model) == [1, 2, 3]
+    model.sort(0)
+    assert vertical_header(model) == [2, 3, 1]
+
+
+class Sized(object):
+    def size(self):
+        return 10
+
+
+def test_summary_of_values_with_size_method(qapp):
+    from py2qt_models import PythonCollectionTreeModel
+    model = PythonCollectionTreeModel([Sized(), numpy.arange(5000.)], array_summary=True)
+    check(model)
+    assert model.data(model.index(0, 0, QtCore.QModelIndex()), QtCore.Qt.DisplayRole)
+
+
+def test_summary_cache_does_not_keep_arrays(qapp):
+    import gc, weakref
+    from conftest import wait_for
+    from py2qt_models import ArraySummary
+    summary = ArraySummary()
+    arr = numpy.arange(100.)
+    ref = weakref.ref(arr)
+    summary.get(arr)
+    assert wait_for(qapp, lambda: summary.get(arr) is not None)
+    del arr
+    assert wait_for(qapp, lambda: gc.collect() >= 0 and ref() is None)
+    assert len(summary.cache) == 0
+    summary.shutdown()
+
+
+def test_refresh_sorted_with_shorter_array(qapp):
+    model = PythonArrayTreeModel(numpy.array([[3, 0], [1, 0], [2, 0]]), tile_cache_size=0)
+    check(model)
+    model.sort(0)
+    model.refresh(numpy.array([[5, 0]]))
+    assert model.rowCount() == 1
+    assert model.data(model.index(0, 0, QtCore.QModelIndex()), QtCore.Qt.DisplayRole) == "5"
+
+
+def test_refresh_clears_tiles(qapp):
+    arr = numpy.arange(6).reshape(3, 2)
+    model = PythonArrayTreeModel(arr)
+    check(model)
+    assert model.data(model.index(0, 0, QtCore.QModelIndex()), QtCore.Qt.DisplayRole) == "0"
+    model.refresh(arr + 100)
+    assert model.data(model.index(0, 0, QtCore.QModelIndex()), QtCore.Qt.DisplayRole) == "100"
+
+
+def test_arrow_int_column_with_nulls(qapp):
+    import pytest
+    pa = pytest.importorskip("pyarrow")
+    table = pa.table({"a": pa.chunked_array([[1, 2], [None, 4]]), "b": [0.5, 1.5, 2.5, 3.5]})
+    model = PythonArrayTreeModel(table)
+    check(model)
+    tiles = [model.data(model.index(r, 0, QtCore.QModelIndex()), QtCore.Qt.DisplayRole) for r in range(4)]
+    assert tiles == ["1", "2", "None", "4"]
+    model.sort(0, QtCore.Qt.DescendingOrder)
+    tiles = [model.data(model.index(r, 0, QtCore.QModelIndex()), QtCore.Qt.DisplayRole) for r in range(4)]
+    assert tiles == ["None", "4", "2", "1"]
@@ -0,0 +1,210 @@
+import numpy
+import pytest
+from qtpy import QtCore
+from qtpy.QtTest import QAbstractItemModelTester
+
+h5py = pytest.importorskip("h5py")
+from py2qt_models_hdf import PythonHDFDatasetModel
+
+R = QtCore.QModelIndex()
+
+
+def check(model):
+    return QAbstractItemModelTester(model, QAbstractItemModelTester.FailureReportingMode.Fatal)
+
+
+def cell(model, row, col):
+    return model.data(model.index(row, col, R), QtCore.Qt.DisplayRole)
+
+
+@pytest.fixture
+def h5file(tmp_path):
+    f = h5py.File(tmp_path / "data.h5", "w")
+    yield f
+    f.close()
+
+
+def test_dataset_compound(qapp, h5file):
+    dtype = numpy.dtype([("a", "i4"), ("b", "f8"), ("c", "i2", (2,))])
+    values = numpy.array([(1, 0.5, (1, 2)), (2, 1.5, (3, 4))], dtype=dtype)
+    ds = h5file.create_dataset("compound", data=values, chunks=(1,))
+    for tile_cache_size in (64, 0):
+        model = PythonHDFDatasetModel(ds, tile_cache_size=tile_cache_size, fmt="%.2f")
+        check(model)
+        assert cell(model, 1, 0) == "(2.00, 1.50, [3 4])"
+        model.shutdown()
+
+
+@pytest.mark.parametrize("shape", [(), (2, 3, 4)])
+def test_dataset_ndim(qapp, h5file, shape):
+    ds = h5file.create_dataset("d", data=numpy.zeros(shape))
+    with pytest.raises(ValueError):
+        PythonHDFDatasetModel(ds)
+
+
+def test_dataset_2d(qapp, h5file):
+    ds = h5file.create_dataset("d", data=numpy.arange(12).reshape(4, 3), chunks=(2, 3))
+    model = PythonHDFDatasetModel(ds)
+    check(model)
+    assert (model.rowCount(R), model.columnCount(R), cell(model, 3, 2)) == (4, 3, "11")
+    model.shutdown()
+
+
+def test_metadata_index_does_not_block_file(qapp, tmp_path):
+    import time
+    from py2qt_models_hdf import HDFMetadataIndex
+    with h5py.File(tmp_path / "many.h5", "w") as f:
+        for i in range(100):
+            g = f.create_group("g%d" % i)
+            g.attrs["n"] = i
+            for j in range(10):
+                g.create_dataset("d%d" % j, data=numpy.arange(3))
+        f["soft"] = h5py.SoftLink("/g1")
+        f["hard"] = f["g2"]
+    f = h5py.File(tmp_path / "many.h5", "r")
+    visited = ["/"]
+    f.visititems(lambda name, obj: visited.append("/" + name))
+    index = HDFMetadataIndex(f)
+    start = time.perf_counter()
+    index.start()
+    worst = 0
+    while not index.finished:
+        t = time.perf_counter()
+        f["g5"].attrs["n"]
+        worst = max(worst, time.perf_counter() - t)
+    total = time.perf_counter() - start
+    assert sorted(index.entries) == sorted(visited)
+    assert index.entries["/g3"].children == ["d%d" % j for j in range(10)]
+    assert worst < max(0.05, total / 4)  # the walk does not hold h5py lock
+    f.close()
+
+
+def test_file_model_poll(qapp, h5file):
+    from py2qt_models_hdf import PythonHDFFileTreeModel
+    g = h5file.create_group("g")
+    g.create_dataset("a", data=numpy.arange(3), maxshape=(None,))
+    g.create_dataset("b", data=numpy.arange(3))
+    model = PythonHDFFileTreeModel(h5file)
+    check(model)
+    group = model.index(0, 0, R)
+    assert model.rowCount(group) == 2
+    changed = []
+    model.dataChanged.connect(lambda a, b: changed.append((a.row(), b.row())))
+    model.poll()
+    assert changed == []  # nothing has changed since loading
+    g["a"].resize((5,))
+    model.poll()
+    assert changed == [(0, 0)]
+    g.move("b", "c")  # renamed and added, number of members is the same
+    model.poll()
+    names = [model.data(model.index(r, model.col_name, group), QtCore.Qt.DisplayRole)
+             for r in range(model.rowCount(group))]
+    assert sorted(names) == ["a", "c"]
+    h5file["top"] = numpy.arange(2)  # new member of the root
+    model.poll()
+    assert model.rowCount(R) == 2
+
+
+def test_dataset_model_poll(qapp, h5file):
+    ds = h5file.create_dataset("d", data=numpy.arange(5), maxshape=(None,), chunks=(4,))
+    model = PythonHDFDatasetModel(ds, prefetch_blocks=0)
+    check(model)
+    assert cell(model, 4, 0) == "4"
+    ds.resize((7,))
+    ds[5:] = [5, 6]
+    model.poll()
+    assert model.rowCount(R) == 7 and cell(model, 6, 0) == "6"
+    model.shutdown()
+
+
+def test_chunk_cache_drops_blocks_read_before_resize(h5file):
+    import threading
+    from py2qt_models_hdf import HDFChunkCache
+    ds = h5file.create_dataset("d", data=numpy.arange(5), maxshape=(None,), chunks=(4,))
+    cache = HDFChunkCache(ds, block_bytes=1)
+    reading, resized = threading.Event(), threading.Event()
+    read = cache._read
+
+    def slow_read(key):
+        block = read(key)
+        reading.set()
+        resized.wait()
+        return block
+    cache._read = slow_read
+    worker = threading.Thread(target=cache.block, args=((1, 0),))
+    worker.start()
+    reading.wait()
+    ds.resize((7,))
+    cache.resize(7)
+    resized.set()
+    worker.join()
+    assert (1, 0) not in cache.cache
+
+
+def make_catalog_files(tmp_path, n):
+    files = []
+    for i in range(n):
+        d = tmp_path / "d{}".format(i)
+        d.mkdir()
+        fn = str(d / "data.h5")
+        with h5py.File(fn, "w") as f:
+            f["x"] = numpy.arange(10) + i
+        files.append(fn)
+    return files
+
+
+def test_catalog_full_paths_and_pins(qapp, tmp_path):
+    from conftest import wait_for
+    from py2qt_models_hdf import PythonHDFCatalogModel
+    files = make_catalog_files(tmp_path, 3)
+    model = PythonHDFCatalogModel(files, workers=1, max_open_files=1)
+    inserted = []
+    model.rowsInserted.connect(lambda parent, first, last: inserted.append(parent.row()))
+    try:
+        assert wait_for(qapp, lambda: len(model.catalog) == 3)
+        qapp.processEvents()
+        assert sorted(inserted) == [0, 1, 2]
+        check(model)
+        for i, fn in enumerate(files):
+            idx = model.index(i, 0, R)
+            assert model.data(idx, QtCore.Qt.DisplayRole) == fn
+            assert model.rowCount(idx) == 1
+        results = model.search("x")
+        assert sorted(model.parent(i).row() for i in results) == [0, 1, 2]
+        ds = model.dataset(model.index(0, 0, model.index(0, 0, R)))
+        for i in (1, 2):
+            model.dataset(model.index(0, 0, model.index(i, 0, R)))
+        assert ds[3] == 3
+    finally:
+        model.handles.closeAll()
+        model._executor.shutdown()
+
+
+def test_catalog_sort_before_scan_and_refresh(qapp, tmp_path):
+    from conftest import wait_for
+    from py2qt_models_hdf import PythonHDFCatalogModel
+    files = []
+    for name in "abc":
+        fn = str(tmp_path / (name + ".h5"))
+        with h5py.File(fn, "w") as f:
+            f["only_in_" + name] = numpy.arange(3)
+        files.append(fn)
+    model = PythonHDFCatalogModel(files, workers=1)
+    try:
+        check(model)
+        model.sort(0, QtCore.Qt.DescendingOrder) # before scanning results arrive
+        assert wait_for(qapp, lambda: len(model.catalog) == 3)
+        qapp.processEvents()
+
+        def contents():
+            return {model.data(model.index(i, 0, R), QtCore.Qt.DisplayRole)[-4]:
+                    model.data(model.index(0, 0, model.index(i, 0, R)), QtCore.Qt.DisplayRole)
+                    for i in range(model.rowCount(R))}
+        expected = {"a": "only_in_a", "b": "only_in_b", "c": "only_in_c"}
+        assert contents() == expected
+        model.refresh()
+        assert model.rowCount(R) == 3
+        assert contents() == expected
+    finally:
+        model.handles.closeAll()
+        model._executor.shutdown()
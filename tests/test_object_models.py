@@ -0,0 +1,124 @@
+from qtpy import QtCore
+from qtpy.QtTest import QAbstractItemModelTester
+
+from conftest import wait_for
+from py2qt_models import PythonCollectionTreeModel, PythonObjectTreeModel
+
+
+class Node(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+R = QtCore.QModelIndex()
+
+
+def check(model):
+    return QAbstractItemModelTester(model, QAbstractItemModelTester.FailureReportingMode.Fatal)
+
+
+def search_paths(app, model, text):
+    index = model.buildSearchIndex(max_depth=4)
+    assert wait_for(app, lambda: index.finished)
+    return [index.path(e) for e in index.find(text)]
+
+
+def test_collection_search(qapp):
+    model = PythonCollectionTreeModel({"a": [1, 2], "b": {"c": "deep"}})
+    check(model)
+    assert ("b", "c") in search_paths(qapp, model, "deep")
+    assert model.search("deep")[0].isValid()
+
+
+def test_object_search_lazy_attributes(qapp):
+    root = Node(b=Node(c="deep"))
+    for lazy in (False, True):
+        model = PythonObjectTreeModel(root, show_double_underscore=False, show_under_score=False,
+                                      lazy_attributes=lazy)
+        check(model)
+        assert ("b", "c") in search_paths(qapp, model, "deep"), lazy
+
+
+def test_refresh_removes_loading_node(qapp):
+    import threading
+    release = threading.Event()
+    a_node = Node(x=1)
+    root = Node(a=a_node, b=Node(y=2))
+    model = PythonObjectTreeModel(root, show_double_underscore=False, show_under_score=False, async_expand=True)
+    iter_children = model._iterChildren
+
+    def slow(el):
+        if el.value is a_node: # listing of "a" is still running when it is removed
+            release.wait(5)
+        return iter_children(el)
+    model._iterChildren = slow
+    rows = {model.data(model.index(i, 0, R), QtCore.Qt.DisplayRole): i for i in range(model.rowCount(R))}
+    a = model.index(rows["a"], 0, R)
+    assert model.rowCount(a) == 1 # "loading..." placeholder
+    future = next(iter(model._jobs.values()))[0]
+    del root.a
+    model.refresh()
+    assert not model._jobs
+    release.set()
+    assert wait_for(qapp, lambda: future.done())
+    qapp.processEvents()
+    assert model.rowCount(R) == 1
+    model.shutdown()
+
+
+def test_virtual_rows_painted_without_elements(qapp):
+    model = PythonCollectionTreeModel({"k{}".format(i): i for i in range(1000)}, virtual_children=True)
+    check(model)
+    for row in range(1000):
+        for col in range(model.columnCount(R)):
+            model.data(model.index(row, col, R), QtCore.Qt.DisplayRole)
+    assert len(model.el0.children.items) == 0
+    assert model.data(model.index(5, model.col_name, R), QtCore.Qt.DisplayRole) == "k5"
+
+
+def test_search_sorted_virtual_dict(qapp):
+    model = PythonCollectionTreeModel({"z": "zzz", "a": "aaa", "m": "mmm"}, virtual_children=True)
+    check(model)
+    model.sort(model.col_name)
+    index = model.indexForPath(["z"])
+    assert model.data(model.index(index.row(), model.col_name, R), QtCore.Qt.DisplayRole) == "z"
+    found = model.search("zzz")
+    assert [model.data(model.index(i.row(), model.col_name, R), QtCore.Qt.DisplayRole) for i in found] == ["z"]
+
+
+def test_compact_nodes(qapp):
+    root = Node(x=10, b=Node(c="deep"), items=[1, 2, 3])
+    for model in (PythonObjectTreeModel(root, show_double_underscore=False, show_under_score=False,
+                                        compact_nodes=True),
+                  PythonCollectionTreeModel({"a": [1, {"b": 2}], "c": "x"}, compact_nodes=True)):
+        check(model)
+        for row in range(model.rowCount(R)):
+            index = model.index(row, 0, R)
+            if not model.hasChildren(index):
+                assert model.rowCount(index) == 0
+
+
+def test_fetch_batches(qapp):
+    model = PythonCollectionTreeModel({"a": list(range(25)), "b": {"c": list(range(7))}}, fetch_batch=10)
+    a = model.index(0, 0, R)
+    assert model.rowCount(a) == 10
+    check(model)
+    assert not model.canFetchMore(model.index(0, 1, R))
+    while model.canFetchMore(a):
+        model.fetchMore(a)
+    assert model.rowCount(a) == 25
+
+
+def test_refresh_container_changed_in_place(qapp):
+    data = {"log": [1, 2], "n": 1}
+    model = PythonCollectionTreeModel(data)
+    check(model)
+    model.refresh() # signatures of containers are recorded
+    changed = []
+    model.dataChanged.connect(lambda a, b: changed.extend(range(a.row(), b.row() + 1)))
+    model.refresh()
+    assert changed == []
+    data["log"].append(3)
+    model.refresh()
+    rows = {model.data(model.index(i, model.col_name, R), QtCore.Qt.DisplayRole): i for i in range(model.rowCount(R))}
+    assert changed == [rows["log"]]
@@ -0,0 +1,34 @@
+import logging
+
+from conftest import wait_for
+from qt_wrapper import QtWrapper, QtWrapperPool
+
+
+class Counter(object):
+    def __init__(self, start=0):
+        self.value = start
+
+    def add(self, n):
+        self.value += n
+        return self.value
+
+
+def test_pool_calls_in_order(qapp):
+    pool = QtWrapperPool(2)
+    try:
+        w = QtWrapper((Counter, 10), pool=pool)
+        assert wait_for(qapp, lambda: w.object is not None)
+        for i in range(5):
+            w.add(1)
+        assert wait_for(qapp, lambda: w.object.value == 15)
+    finally:
+        pool.shutdown()
+
+
+def test_create_after_pool_shutdown(qapp, caplog):
+    pool = QtWrapperPool(1)
+    pool.shutdown()
+    with caplog.at_level(logging.WARNING):
+        w = QtWrapper(Counter, pool=pool)
+    assert w.object is None
+    assert "pool is shut down" in caplog.text
@@ -0,0 +1,162 @@
+import zipfile
+from qtpy import QtCore
+from qtpy.QtTest import QAbstractItemModelTester
+
+from conftest import wait_for
+from py2qt_models import PythonZipFileTreeModel
+
+R = QtCore.QModelIndex()
+
+
+def check(model):
+    return QAbstractItemModelTester(model, QAbstractItemModelTester.FailureReportingMode.Fatal)
+
+
+def names(model, parent=R):
+    return sorted(model.data(model.index(i, 0, parent), QtCore.Qt.DisplayRole) for i in range(model.rowCount(parent)))
+
+
+def make_zip(path, members):
+    with zipfile.ZipFile(path, "w") as z:
+        for name, data in members.items():
+            z.writestr(name, data)
+    return str(path)
+
+
+def test_background_zip_batches(qapp, tmp_path):
+    fn = make_zip(tmp_path / "a.zip", {"d/f{}.txt".format(i): "x" for i in range(250)})
+    model = PythonZipFileTreeModel(fn, background=True, batch_size=100)
+    batches = []
+    model.sigMembersRead.connect(lambda batch, result: batch and batches.append(len(batch)))
+    check(model)
+    assert wait_for(qapp, lambda: not model.loading)
+    assert batches == [100, 100, 50] # sent while central directory is parsed
+    assert names(model) == ["d/"]
+    d = model.index(0, 0, R)
+    assert model.rowCount(d) == 250
+    assert model.data(model.index(0, 0, d), model.PreviewRole) == "x"
+    model.close()
+    assert model.zipfile.fp is None
+
+
+def test_sync_zip_closed(qapp, tmp_path):
+    fn = make_zip(tmp_path / "a.zip", {"f.txt": "x"})
+    model = PythonZipFileTreeModel(fn)
+    check(model)
+    assert names(model) == ["f.txt"]
+    z = model.zipfile
+    model.close()
+    assert z.fp is None
+    opened = zipfile.ZipFile(fn)
+    model = PythonZipFileTreeModel(opened)
+    model.close()
+    assert opened.fp is not None # not opened by the model
+    opened.close()
+
+
+def test_preview_error_text(qapp, tmp_path):
+    fn = make_zip(tmp_path / "a.zip", {"f.txt": "hello"})
+    with open(fn, "r+b") as f: # corrupt stored data, reading fails on CRC check
+        data = f.read()
+        f.seek(data.index(b"hello"))
+        f.write(b"HELLO")
+    model = PythonZipFileTreeModel(fn)
+    text = model.data(model.index(0, 0, R), model.PreviewRole)
+    assert text.startswith("error:")
+    model.close()
+
+
+def test_preview_model_npy_v3(qapp, tmp_path):
+    import io
+    import numpy
+    buf = io.BytesIO()
+    arr = numpy.zeros(3, dtype=[("\u00e4", "i4")]) # utf-8 field name needs version 3.0
+    numpy.lib.format.write_array(buf, arr, version=(3, 0))
+    fn = make_zip(tmp_path / "a.zip", {"a.npy": buf.getvalue()})
+    model = PythonZipFileTreeModel(fn)
+    arr_model = model.previewModel("a.npy")
+    assert arr_model.array.dtype.names == ("\u00e4",)
+    assert arr_model.rowCount(R) == 3
+    model.close()
+
+
+def make_nested(tmp_path):
+    import io
+    inner = io.BytesIO()
+    with zipfile.ZipFile(inner, "w") as z:
+        z.writestr("in.txt", "inner")
+    fn = str(tmp_path / "outer.zip")
+    with zipfile.ZipFile(fn, "w") as z:
+        z.writestr("inner.zip", inner.getvalue())
+        z.writestr("bad.zip", b"not a zip file")
+    return fn
+
+
+def test_nested_refresh_and_errors(qapp, tmp_path):
+    model = PythonZipFileTreeModel(make_nested(tmp_path))
+    check(model)
+    rows = {model.data(model.index(i, 0, R), QtCore.Qt.DisplayRole): i for i in range(model.rowCount(R))}
+    bad = model.index(rows["bad.zip"], 0, R)
+    assert model.rowCount(bad) == 0
+    assert not model.hasChildren(bad)
+    assert len(model.nested_errors) == 1
+    inner = model.index(rows["inner.zip"], 0, R)
+    assert names(model, inner) == ["in.txt"]
+    archive = model.archive_index
+    model.refresh()
+    assert model.archive_index is archive
+    assert names(model, model.index(rows["inner.zip"], 0, R)) == ["in.txt"]
+    nested = [b for b in model._owned if b is not model.backend]
+    model.close()
+    assert nested and nested[0].archive.fp is None
+
+
+def test_tar(qapp, tmp_path):
+    import io
+    import tarfile
+    fn = str(tmp_path / "a.tar")
+    with tarfile.open(fn, "w") as t:
+        info = tarfile.TarInfo("d/f.txt")
+        info.size = 5
+        t.addfile(info, io.BytesIO(b"hello"))
+    model = PythonZipFileTreeModel(fn)
+    check(model)
+    d = model.index(0, 0, R)
+    assert names(model, d) == ["f.txt"]
+    assert model.data(model.index(0, 0, d), model.PreviewRole) == "hello"
+    model.close()
+
+
+def test_archive_backend_is_abstract():
+    import pytest
+    from py2qt_models import ArchiveBackend
+    with pytest.raises(TypeError):
+        ArchiveBackend(None)
+
+
+def test_central_directory_streamed(tmp_path):
+    import io
+    from py2qt_models import _readCentralDirectory
+
+    class CountingFile(io.BytesIO):
+        n = 0
+
+        def read(self, size=-1):
+            data = super().read(size)
+            self.n += len(data)
+            return data
+    buf = io.BytesIO(b"prefix")
+    with zipfile.ZipFile(buf, "a") as z:
+        z.comment = b"comment"
+        for i in range(2000):
+            z.writestr("d/fä{}.txt".format(i), "x" * i)
+    f = CountingFile(buf.getvalue())
+    infos = _readCentralDirectory(f)
+    first = next(infos)
+    assert f.n < 70000 # end record (with up to 64 kB comment) and one central directory record
+    expected = zipfile.ZipFile(io.BytesIO(buf.getvalue())).infolist()
+    infos = [first] + list(infos)
+    assert [(i.filename, i.header_offset, i.file_size, i.CRC) for i in infos] == \
+        [(i.filename, i.header_offset, i.file_size, i.CRC) for i in expected]
+    with zipfile.ZipFile(f) as z:
+        assert z.open(infos[5]).read() == b"x" * 5